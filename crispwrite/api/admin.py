@@ -0,0 +1,14 @@
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdminMixin:
+    """ModelAdmin defaults for tables that grow to millions of rows.
+
+    Counts are bounded by EstimatedCountPaginator, the second full-table
+    count behind "N total" is skipped, and the changelist is ordered by the
+    primary key so every page is an index range scan.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ("-id",)
+    list_per_page = 50
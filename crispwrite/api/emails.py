@@ -0,0 +1,85 @@
+import html
+
+from django.template import engines
+from django.template.base import TextNode, Variable, VariableNode
+from django.template.defaulttags import AutoEscapeControlNode
+
+
+def _escape(value):
+    # django.utils.html.conditional_escape without its SafeString wrapping.
+    return value.__html__() if hasattr(value, "__html__") else html.escape(str(value))
+
+
+def _flatten(nodelist, autoescape, parts, variables):
+    for node in nodelist:
+        if isinstance(node, TextNode):
+            parts.append(node.s)
+        elif isinstance(node, AutoEscapeControlNode):
+            if not _flatten(node.nodelist, node.setting, parts, variables):
+                return False
+        elif (
+            isinstance(node, VariableNode)
+            and not node.filter_expression.filters
+            and isinstance(node.filter_expression.var, Variable)
+            and len(node.filter_expression.var.lookups or ()) == 1
+            and not node.filter_expression.var.translate
+        ):
+            variables.append((len(parts), node.filter_expression.var.lookups[0], autoescape))
+            parts.append("")
+        else:
+            return False
+    return True
+
+
+def _compile(template):
+    """Pre-split a template into its text parts and the variables between them.
+
+    Returns ``(parts, variables)``, where each variable is ``(index into
+    parts, name, autoescape)``, or None for templates that use anything but
+    text, ``autoescape`` blocks and plain ``{{ name }}`` variables; those are
+    rendered by Django.
+    """
+    parts, variables = [], []
+    if not _flatten(template.template.nodelist, True, parts, variables):
+        return None
+    return parts, variables
+
+
+class _Body:
+    def __init__(self, template):
+        self.template = template
+        self.compiled = _compile(template)
+
+    def render(self, context):
+        if self.compiled is None:
+            return self.template.render(context)
+        parts, variables = self.compiled
+        parts = parts.copy()
+        for index, name, autoescape in variables:
+            value = context.get(name, "")
+            parts[index] = _escape(value) if autoescape else str(value)
+        return "".join(parts)
+
+
+class EmailTemplate:
+    """A transactional email compiled once and rendered per recipient.
+
+    The text and HTML bodies are Django templates under ``emails/`` in an
+    app's ``templates`` directory, with their CSS already inlined into
+    ``style`` attributes. They are parsed when the template is defined (apps
+    define theirs at startup from ``AppConfig.ready``). A body made only of
+    text and plain ``{{ name }}`` variables is then pre-split around them, so
+    sending escapes the values and joins them with the text, without the
+    per-call parse of the format strings it replaced. Bodies using tags or
+    filters are rendered by Django.
+    """
+
+    def __init__(self, subject, name):
+        engine = engines["django"]
+        self.subject = subject
+        self.text = _Body(engine.get_template(f"emails/{name}.txt"))
+        self.html = _Body(engine.get_template(f"emails/{name}.html"))
+
+    def render(self, **context):
+        """Return ``(subject, text_body, html_body)`` for one recipient."""
+        return self.subject, self.text.render(context), self.html.render(context)
@@ -0,0 +1,174 @@
+"""Idempotency-Key support for the endpoints clients retry.
+
+``@idempotent`` goes outermost on a view, above ``@api_view``, and works on
+sync and async views alike. A request that carries an ``Idempotency-Key``
+header runs once. Its response is kept in the Django cache for
+``IDEMPOTENCY_TTL`` seconds, keyed by the key, the caller and the route, and
+every retry gets it back with ``Idempotent-Replayed: true``. Requests
+without the header are passed straight through.
+
+The caller is the session user, or else a hash of the Authorization header,
+or for anonymous requests a hash of the client address (as the rate limits
+read it), so a key never replays someone else's response. The body is fingerprinted
+as well, and reusing a key for a different request is a 422. A duplicate
+that arrives while the first request is still running waits up to
+``IDEMPOTENCY_WAIT`` seconds for its response, then gets a 409. Responses
+with a 5xx status are not kept, so those requests can be retried. Like the
+rate limits, this needs a cache shared by all processes.
+"""
+import asyncio
+import hashlib
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 255
+# Seconds between checks while a duplicate waits for the first request.
+POLL_INTERVAL = 0.05
+
+
+def _caller(request, user):
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    authorization = request.META.get("HTTP_AUTHORIZATION")
+    if authorization:
+        return "auth:" + hashlib.sha256(authorization.encode()).hexdigest()
+    address = request.META.get(settings.RATE_LIMIT_IP_META, "")
+    return "anonymous:" + hashlib.sha256(address.encode()).hexdigest()
+
+
+def _cache_key(request, key, user):
+    route = request.resolver_match.url_name if request.resolver_match else request.path
+    digest = hashlib.sha256("\0".join([route, _caller(request, user), key]).encode()).hexdigest()
+    return f"idem:{digest}"
+
+
+def _fingerprint(request):
+    return hashlib.sha256(request.method.encode() + b"\0" + request.body).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        return JsonResponse({"detail": "Idempotency-Key was already used for a different request"}, status=422)
+    response = HttpResponse(stored["content"], status=stored["status"])
+    for header, value in stored["headers"]:
+        response[header] = value
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _in_progress():
+    response = JsonResponse({"detail": "A request with this Idempotency-Key is still in progress"}, status=409)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _claim(cache_key, fingerprint):
+    """Return a response to replay, True once this request may run, or None to wait."""
+    stored = cache.get(cache_key)
+    if stored is not None:
+        return _replay(stored, fingerprint)
+    if not cache.add(f"{cache_key}:lock", True, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+        return None
+    # The first request may have finished between the get and the add.
+    stored = cache.get(cache_key)
+    if stored is not None:
+        cache.delete(f"{cache_key}:lock")
+        return _replay(stored, fingerprint)
+    return True
+
+
+def _finish(cache_key, fingerprint, response):
+    try:
+        if response.streaming or response.status_code >= 500:
+            return
+        if hasattr(response, "render"):
+            # DRF responses are rendered by the handler after the view returns.
+            response.render()
+        cache.set(
+            cache_key,
+            {
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                "headers": list(response.items()),
+                "content": response.content,
+            },
+            settings.IDEMPOTENCY_TTL,
+        )
+    finally:
+        cache.delete(f"{cache_key}:lock")
+
+
+def _check_key(request):
+    key = request.META.get(HEADER)
+    if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+        return key, JsonResponse(
+            {"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status=400
+        )
+    return key, None
+
+
+def idempotent(view):
+    """Run a view once per ``Idempotency-Key`` and replay its response to retries."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            key, error = _check_key(request)
+            if error is not None:
+                return error
+            if key is None:
+                return await view(request, *args, **kwargs)
+
+            cache_key = _cache_key(request, key, await request.auser())
+            fingerprint = _fingerprint(request)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+            while (claim := await sync_to_async(_claim)(cache_key, fingerprint)) is None:
+                if time.monotonic() >= deadline:
+                    return _in_progress()
+                await asyncio.sleep(POLL_INTERVAL)
+            if claim is not True:
+                return claim
+            response = None
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                if response is None:
+                    await sync_to_async(cache.delete)(f"{cache_key}:lock")
+                else:
+                    await sync_to_async(_finish)(cache_key, fingerprint, response)
+            return response
+        return wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key, error = _check_key(request)
+        if error is not None:
+            return error
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        cache_key = _cache_key(request, key, request.user)
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while (claim := _claim(cache_key, fingerprint)) is None:
+            if time.monotonic() >= deadline:
+                return _in_progress()
+            time.sleep(POLL_INTERVAL)
+        if claim is not True:
+            return claim
+        response = None
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            if response is None:
+                cache.delete(f"{cache_key}:lock")
+            else:
+                _finish(cache_key, fingerprint, response)
+        return response
+    return wrapper
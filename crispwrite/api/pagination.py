@@ -0,0 +1,41 @@
+"""Pagination that does not count every row of a large table."""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Below this many rows an exact COUNT(*) is cheap enough to run.
+EXACT_COUNT_LIMIT = 10_000
+
+
+def estimated_row_count(model, using="default"):
+    """Return the planner's row estimate for ``model``'s table, or None.
+
+    Only PostgreSQL keeps one that is cheap to read; elsewhere this
+    returns None and callers fall back to a bounded count.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is exact for small results and estimated for big ones.
+
+    An unfiltered queryset uses the table estimate once it passes
+    ``EXACT_COUNT_LIMIT``. Anything else is counted with a LIMIT, so a
+    filter that matches millions of rows reports ``EXACT_COUNT_LIMIT`` rows
+    and pagination stops there instead of scanning the whole table.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return min(queryset.order_by()[:EXACT_COUNT_LIMIT + 1].count(), EXACT_COUNT_LIMIT)
@@ -0,0 +1,112 @@
+"""Sliding-window rate limiting for the public endpoints.
+
+Limits come from ``settings.RATE_LIMITS``, keyed by URL name::
+
+    RATE_LIMITS = {
+        'login': {'ip': '20/m', 'email': '10/m'},
+    }
+
+Each dimension (``ip``, ``email`` or ``route``) is counted separately in the
+Django cache. A window is approximated from the current and previous
+fixed-window counters, weighting the previous one by how much of it still
+overlaps the sliding window. That is two cache keys per dimension, and an
+``add``, an ``incr`` and a ``get`` per request. The request is counted
+before it is checked, against the value ``incr`` returns, so concurrent
+requests can't all slip in under the limit.
+"""
+import hashlib
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """``"20/m"`` -> ``(20, 60)``."""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period]
+
+
+def _request_email(request):
+    if request.content_type in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        email = request.POST.get("email")
+    else:
+        # The JSON views parse the body whatever the Content-Type says.
+        try:
+            email = json.loads(request.body or b"{}").get("email")
+        except (ValueError, AttributeError):
+            return None
+    return email.strip().lower() if isinstance(email, str) and email else None
+
+
+def _identity(request, dimension):
+    if dimension == "ip":
+        return request.META.get(settings.RATE_LIMIT_IP_META, "")
+    if dimension == "email":
+        email = _request_email(request)
+        return email and hashlib.md5(email.encode(), usedforsecurity=False).hexdigest()
+    if dimension == "route":
+        return "all"
+    raise ValueError(f"Unknown rate limit dimension: {dimension}")
+
+
+def hit(key, limit, window, now=None):
+    """Count a request against ``key`` and return seconds to wait, or 0.
+
+    Rejected requests are not counted, so a client that backs off for the
+    returned Retry-After is let through again.
+    """
+    now = time.time() if now is None else now
+    current = int(now // window)
+    elapsed = (now % window) / window
+    current_key, previous_key = f"{key}:{current}", f"{key}:{current - 1}"
+
+    cache.add(current_key, 0, window * 2)
+    try:
+        in_current = cache.incr(current_key) - 1
+    except ValueError:
+        # The counter expired between the add and the incr.
+        cache.add(current_key, 1, window * 2)
+        in_current = 0
+    in_previous = cache.get(previous_key, 0)
+    if in_previous * (1 - elapsed) + in_current < limit:
+        return 0
+
+    cache.decr(current_key)
+    if in_current >= limit:
+        # Wait for this window to roll over and decay below the limit.
+        wait = window * (1 - elapsed) + window * (1 - limit / in_current)
+    else:
+        wait = window * (1 - (limit - in_current) / in_previous - elapsed)
+    return max(1, math.ceil(wait))
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    # MiddlewareMixin makes this async capable, so it doesn't pin the async
+    # views to a thread; only process_view runs in one, briefly.
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATE_LIMIT_ENABLED or request.method == "OPTIONS":
+            return None
+        route = request.resolver_match.url_name
+        policy = settings.RATE_LIMITS.get(route)
+        if not policy:
+            return None
+
+        for dimension, rate in policy.items():
+            identity = _identity(request, dimension)
+            if not identity:
+                continue
+            limit, window = parse_rate(rate)
+            retry_after = hit(f"rl:{route}:{dimension}:{identity}", limit, window)
+            if retry_after:
+                response = JsonResponse({"detail": "Too many requests"}, status=429)
+                response["Retry-After"] = str(retry_after)
+                return response
+        return None
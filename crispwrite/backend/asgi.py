@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Route register, login and create_checkout to their async variants (see
+# payments.async_views).
+os.environ.setdefault('ASYNC_AUTH_VIEWS', 'True')
+os.environ.setdefault('ASYNC_CHECKOUT_VIEW', 'True')
 
 application = get_asgi_application()
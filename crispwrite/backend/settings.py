@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -54,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.ratelimit.RateLimitMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -96,6 +98,24 @@ if all([os.getenv('PGDATABASE'), os.getenv('PGUSER'), os.getenv('PGPASSWORD'), o
         'PORT': os.getenv('PGPORT'),
     }
 
+# Cache
+# Per-process memory by default; point REDIS_URL at a shared instance in
+# production so cache invalidation is seen by every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # Room for a batch entitlement check's worth of users; the default
+        # of 300 entries would cull them as they are written.
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+}
+
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -128,7 +148,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  
+        'payments.authentication.EntitlementJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -149,6 +169,10 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Embed the user's role and active tool IDs as claims on issued access tokens
+# so that tool backends can authorize requests without calling back here.
+JWT_ENTITLEMENT_CLAIMS = os.getenv('JWT_ENTITLEMENT_CLAIMS', 'False') == 'True'
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5000",
@@ -160,17 +184,23 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+# Link carries the next-page cursor of paginated lists such as my-subscriptions.
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Link', 'Retry-After']
 
 # Custom User Model
 AUTH_USER_MODEL = 'payments.User'
 
 # Email settings
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Use django.core.mail.backends.locmem.EmailBackend (or the file backend) in
+# tests and local development.
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_HOST_USER = os.getenv('EMAIL_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASSWORD')
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
+EMAIL_TIMEOUT = 30
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_USER', 'noreply@crispai.ca')
 
 # Custom settings
@@ -178,3 +208,88 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
 SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
+
+# Seconds a user's cached set of active tool IDs may live before it is
+# rebuilt from the database. Writes invalidate it immediately, but only in
+# a cache every process shares: without REDIS_URL the webhook, sweep and
+# reconcile commands couldn't reach the web workers' caches, so entitlement
+# caching is off.
+ENTITLEMENT_CACHE_TIMEOUT = int(os.getenv('ENTITLEMENT_CACHE_TIMEOUT', 300)) if os.getenv('REDIS_URL') else 0
+
+# Browsers and CDNs may cache the public tool catalog for this many seconds.
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', 300))
+# How often each process re-checks whether the tool catalog has changed.
+CATALOG_VERSION_CHECK_INTERVAL = int(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', 30))
+
+# Serve register and login from the async views in payments.async_views.
+# backend/asgi.py turns this on for the ASGI entry point.
+ASYNC_AUTH_VIEWS = os.getenv('ASYNC_AUTH_VIEWS', 'False') == 'True'
+# Threads hashing passwords for the async views, and how many hashes may be
+# running or waiting before new requests are turned away with a 503.
+PASSWORD_HASHER_WORKERS = int(os.getenv('PASSWORD_HASHER_WORKERS', 4))
+PASSWORD_HASHER_MAX_PENDING = int(os.getenv('PASSWORD_HASHER_MAX_PENDING', 16))
+PASSWORD_HASHER_QUEUE_TIMEOUT = 2
+
+# Serve create_checkout from payments.async_views; on under ASGI.
+ASYNC_CHECKOUT_VIEW = os.getenv('ASYNC_CHECKOUT_VIEW', 'False') == 'True'
+# Outbound Stripe calls from the async views: timeouts in seconds, how many
+# may be in flight per process, and how long a request may wait for a slot
+# before getting a 503. STRIPE_API_BASE points them at another server, such
+# as scripts/fake_stripe.py.
+STRIPE_CONNECT_TIMEOUT = float(os.getenv('STRIPE_CONNECT_TIMEOUT', 3))
+STRIPE_READ_TIMEOUT = float(os.getenv('STRIPE_READ_TIMEOUT', 10))
+STRIPE_MAX_IN_FLIGHT = int(os.getenv('STRIPE_MAX_IN_FLIGHT', 20))
+STRIPE_QUEUE_TIMEOUT = 1
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')
+
+# Per-endpoint request limits enforced by api.ratelimit, keyed by URL name.
+# Each entry maps a dimension (ip, email or route) to "<count>/<s|m|h|d>".
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True') == 'True'
+# Where the client address comes from; set to HTTP_X_REAL_IP or similar
+# behind a proxy that overwrites that header.
+RATE_LIMIT_IP_META = os.getenv('RATE_LIMIT_IP_META', 'REMOTE_ADDR')
+RATE_LIMITS = {
+    'newsletter-subscribe': {'ip': '10/m', 'email': '3/h'},
+    'contact-submit': {'ip': '5/m', 'email': '5/h'},
+    'book-meeting': {'ip': '5/m', 'email': '5/h'},
+    'chat': {'ip': '30/m', 'route': '600/m'},
+    'login': {'ip': '20/m', 'email': '10/m'},
+    'register': {'ip': '5/m', 'email': '3/h'},
+    'accept-invite': {'ip': '10/m'},
+}
+
+# API keys of the tool backends allowed to call service endpoints such as
+# the batch entitlement check, as "name:key,name:key".
+SERVICE_API_KEYS = dict(
+    item.split(':', 1) for item in os.getenv('SERVICE_API_KEYS', '').split(',') if ':' in item
+)
+# Users per batch entitlement request, for JSON and for streamed NDJSON.
+ENTITLEMENT_BATCH_MAX = int(os.getenv('ENTITLEMENT_BATCH_MAX', 5000))
+ENTITLEMENT_BATCH_STREAM_MAX = int(os.getenv('ENTITLEMENT_BATCH_STREAM_MAX', 100000))
+
+# Entitlement changes pushed to the tool backends: how long a change waits
+# so later changes to the same subscription replace it in one batch, and
+# the timeout of each callback, in seconds.
+ENTITLEMENT_NOTIFY_WINDOW = int(os.getenv('ENTITLEMENT_NOTIFY_WINDOW', 5))
+ENTITLEMENT_NOTIFY_TIMEOUT = float(os.getenv('ENTITLEMENT_NOTIFY_TIMEOUT', 5))
+
+# Tool usage metering (payments.metering): seconds between flushes of each
+# process's counts, which bounds what a crash can lose, and how stale the
+# in-memory quota view may get before it is reloaded.
+METERING_FLUSH_INTERVAL = float(os.getenv('METERING_FLUSH_INTERVAL', 2))
+METERING_QUOTA_REFRESH = float(os.getenv('METERING_QUOTA_REFRESH', 10))
+
+# Idempotency-Key handling (api.idempotency): how long a response is kept
+# for replay, how long a running request holds its key, and how long a
+# concurrent duplicate waits for it, all in seconds.
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', 10))
+
+# Members per bulk seat provisioning request.
+SEAT_PROVISION_MAX = int(os.getenv('SEAT_PROVISION_MAX', 10000))
+# The frontend page where an invited member chooses a password; it posts
+# to /api/invite/accept/<uidb64>/<token>/.
+INVITE_ACCEPT_URL = os.getenv(
+    'INVITE_ACCEPT_URL', 'https://www.marketplace.crispai.ca/accept-invite/{uidb64}/{token}'
+)
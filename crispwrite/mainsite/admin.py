@@ -1,9 +1,47 @@
-
 from django.contrib import admin
+from django.utils import timezone
+
+from api.admin import LargeTableAdminMixin
 from .models import NewsletterSubscription, ContactMessage, Meeting, ChatSession, ChatMessage
 
 admin.site.register(NewsletterSubscription)
 admin.site.register(ContactMessage)
-admin.site.register(Meeting)
-admin.site.register(ChatSession)
-admin.site.register(ChatMessage)
+
+
+@admin.register(Meeting)
+class MeetingAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("name", "email", "meeting_type", "preferred_date", "status")
+    list_filter = ("status",)
+    search_fields = ("email__exact",)
+    actions = ["mark_confirmed", "mark_completed", "mark_cancelled"]
+
+    def _set_status(self, request, queryset, status):
+        # A bulk status change does not send the per-meeting emails.
+        updated = queryset.exclude(status=status).update(status=status, updated_at=timezone.now())
+        self.message_user(request, f"Marked {updated} meetings as {status}.")
+
+    @admin.action(description="Mark selected meetings as confirmed")
+    def mark_confirmed(self, request, queryset):
+        self._set_status(request, queryset, "confirmed")
+
+    @admin.action(description="Mark selected meetings as completed")
+    def mark_completed(self, request, queryset):
+        self._set_status(request, queryset, "completed")
+
+    @admin.action(description="Mark selected meetings as cancelled")
+    def mark_cancelled(self, request, queryset):
+        self._set_status(request, queryset, "cancelled")
+
+
+@admin.register(ChatSession)
+class ChatSessionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("session_id", "created_at", "last_activity")
+    search_fields = ("session_id__exact",)
+
+
+@admin.register(ChatMessage)
+class ChatMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "session", "role", "timestamp")
+    list_select_related = ("session",)
+    search_fields = ("session__session_id__exact",)
+    raw_id_fields = ("session",)
@@ -5,3 +5,7 @@ from django.apps import AppConfig
 class MainsiteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainsite'
+
+    def ready(self):
+        # Compile the email templates once at startup.
+        from . import emails  # noqa: F401
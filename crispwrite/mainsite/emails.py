@@ -0,0 +1,4 @@
+from api.emails import EmailTemplate
+
+CONTACT_FORM = EmailTemplate("New Contact Form Submission - CrispAI Website", "contact_form")
+NEWSLETTER_SUBSCRIPTION = EmailTemplate("New Newsletter Subscription - CrispAI Website", "newsletter_subscription")
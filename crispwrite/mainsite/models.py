@@ -50,6 +50,12 @@ class Meeting(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "preferred_date"], name="meeting_status_date_idx"),
+            models.Index(fields=["email"], name="meeting_email_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.meeting_type}"
 
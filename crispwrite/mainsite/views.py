@@ -11,6 +11,8 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import NewsletterSubscription, ContactMessage, Meeting, ChatSession, ChatMessage
 from .serializers import NewsletterSubscriptionSerializer, ContactMessageSerializer, MeetingSerializer
+from . import emails
+from api.idempotency import idempotent
 import uuid
 import time
 from django.shortcuts import render
@@ -108,6 +110,7 @@ GUIDELINES:
 - Be efficient - get to the point immediately
 """
 
+@idempotent
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def newsletter_subscribe(request):
@@ -121,6 +124,7 @@ def newsletter_subscribe(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@idempotent
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def contact_submit(request):
@@ -135,6 +139,7 @@ def contact_submit(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@idempotent
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def book_meeting(request):
@@ -240,27 +245,15 @@ def health(request):
     return Response({'status': 'healthy'})
 
 def send_contact_form_email(contact_data):
-    subject = 'New Contact Form Submission - CrispAI Website'
-    html_content = f"""
-    <h2>New Contact Form Submission</h2>
-    <div style="font-family: Arial, sans-serif; line-height: 1.6;">
-        <p><strong>Name:</strong> {contact_data['name']}</p>
-        <p><strong>Email:</strong> {contact_data['email']}</p>
-        <p><strong>Phone:</strong> {contact_data.get('phone', 'Not provided')}</p>
-        <p><strong>Message:</strong></p>
-        <div style="background-color: #f5f5f5; padding: 15px; border-left: 4px solid #007bff; margin: 10px 0;">
-            {contact_data['message'].replace(chr(10), '<br>')}
-        </div>
-        <hr>
-        <p style="color: #666; font-size: 12px;">
-            This email was sent from the CrispAI website contact form.
-        </p>
-    </div>
-    """
-    
+    subject, text_content, html_content = emails.CONTACT_FORM.render(
+        name=contact_data['name'],
+        email=contact_data['email'],
+        phone=contact_data.get('phone'),
+        message=contact_data['message'],
+    )
     msg = EmailMultiAlternatives(
         subject,
-        contact_data['message'],
+        text_content,
         settings.DEFAULT_FROM_EMAIL,
         ['crispailtd@gmail.com']
     )
@@ -268,24 +261,15 @@ def send_contact_form_email(contact_data):
     msg.send()
 
 def send_newsletter_subscription_email(subscription_data):
-    subject = 'New Newsletter Subscription - CrispAI Website'
-    html_content = f"""
-    <h2>New Newsletter Subscription</h2>
-    <div style="font-family: Arial, sans-serif; line-height: 1.6;">
-        <p><strong>Email:</strong> {subscription_data['email']}</p>
-        <p><strong>First Name:</strong> {subscription_data.get('firstName', 'Not provided')}</p>
-        <p><strong>Last Name:</strong> {subscription_data.get('lastName', 'Not provided')}</p>
-        <p><strong>Subscription Date:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        <hr>
-        <p style="color: #666; font-size: 12px;">
-            This email was sent from the CrispAI website newsletter subscription form.
-        </p>
-    </div>
-    """
-    
+    subject, text_content, html_content = emails.NEWSLETTER_SUBSCRIPTION.render(
+        email=subscription_data['email'],
+        first_name=subscription_data.get('firstName'),
+        last_name=subscription_data.get('lastName'),
+        subscribed_at=datetime.now(),
+    )
     msg = EmailMultiAlternatives(
         subject,
-        f"New newsletter subscription from {subscription_data['email']}",
+        text_content,
         settings.DEFAULT_FROM_EMAIL,
         ['crispailtd@gmail.com']
     )
@@ -0,0 +1,106 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User, Subscription
+from .tokens import EntitlementRefreshToken
+from .utils import generate_activation_link
+from . import emails, outbox
+
+REGISTRATION_FIELDS = ["first_name", "last_name", "email", "phone", "password", "repeat_password"]
+DUPLICATE_EMAIL_ERROR = "An account with this email already exists"
+
+
+def validate_registration(data):
+    """Return an error message for an invalid registration payload, else None."""
+    for field in REGISTRATION_FIELDS:
+        if not data.get(field):
+            return f"{field} is required"
+    if data["password"] != data["repeat_password"]:
+        return "Passwords do not match"
+    return None
+
+
+def create_inactive_user(data, password_hash, request):
+    """Create the user and queue its activation email once the user is committed.
+
+    A registration that loses the race for the email address rolls back
+    before anything is queued. The email is delivered by send_outbox, so
+    SMTP never sits on the registration request.
+    """
+    with transaction.atomic():
+        user = User.objects.create(
+            username=data["email"],
+            email=data["email"],
+            password=password_hash,
+            first_name=data["first_name"],
+            last_name=data["last_name"],
+            phone=data["phone"],
+            is_active=False
+        )
+        subject, text_body, html_body = emails.ACTIVATION.render(
+            first_name=data["first_name"],
+            activation_url=generate_activation_link(user, request),
+        )
+        transaction.on_commit(partial(outbox.queue_email, subject, text_body, [user.email], html_body=html_body))
+    return user
+
+
+def login_payload(user):
+    """Record a successful login and return its tokens and profile."""
+    # Sets last_login, which never_activated relies on.
+    update_last_login(None, user)
+    token_class = EntitlementRefreshToken if settings.JWT_ENTITLEMENT_CLAIMS else RefreshToken
+    refresh = token_class.for_user(user)
+    return {
+        "refresh": str(refresh),
+        "access": str(refresh.access_token),
+        "user": {
+            "email": user.email,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "role": user.role if hasattr(user, 'role') else '',
+        }
+    }
+
+
+def never_activated(cutoff):
+    """Inactive users who joined before ``cutoff``, never logged in and never subscribed.
+
+    Users an admin deactivated, and provisioned seats waiting for their
+    invitation to be accepted, have subscriptions and are never matched.
+    """
+    return User.objects.filter(
+        ~Exists(Subscription.objects.filter(user=OuterRef("pk"))),
+        is_active=False,
+        last_login__isnull=True,
+        date_joined__lt=cutoff,
+    )
+
+
+def purge_never_activated(cutoff, chunk_size=1000):
+    """Delete never-activated users in primary key ranges of ``chunk_size``.
+
+    Each range is deleted in its own short transaction together with the
+    rows that cascade from it (subscriptions, group and permission links,
+    admin log entries). Rows another transaction has locked are skipped and
+    picked up by the next run. Yields ``(last_pk, deleted)`` per range.
+    """
+    bounds = never_activated(cutoff).aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return
+    for start in range(bounds["low"], bounds["high"] + 1, chunk_size):
+        end = min(start + chunk_size, bounds["high"] + 1)
+        with transaction.atomic():
+            ids = list(
+                never_activated(cutoff)
+                .filter(pk__gte=start, pk__lt=end)
+                .select_for_update(skip_locked=True)
+                .values_list("pk", flat=True)
+            )
+            deleted = User.objects.filter(pk__in=ids).delete()[1].get(User._meta.label, 0) if ids else 0
+        yield end - 1, deleted
@@ -1,7 +1,169 @@
-
 from django.contrib import admin
-from .models import User, Subscription, Tool  
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db import transaction
+from django.utils import timezone
+
+from api.admin import LargeTableAdminMixin
+from .models import (
+    User, Subscription, Tool, EntitlementEndpoint, EntitlementNotification, UsageCounter,
+    StripePrice, StripeProduct, WebhookEvent,
+)
+from . import entitlements, ledger, registry
+
+# Ids per UPDATE in bulk actions, to stay under database parameter limits.
+ACTION_CHUNK_SIZE = 1000
+
+
+def _chunks(items):
+    for start in range(0, len(items), ACTION_CHUNK_SIZE):
+        yield items[start:start + ACTION_CHUNK_SIZE]
+
+
+@admin.register(User)
+class UserAdmin(LargeTableAdminMixin, BaseUserAdmin):
+    list_display = ("username", "first_name", "last_name", "role", "is_active", "date_joined")
+    list_filter = ("is_active",)
+    # Exact matches use the unique index on username (the email address).
+    search_fields = ("username__exact",)
+    fieldsets = BaseUserAdmin.fieldsets + (("Profile", {"fields": ("phone", "role")}),)
+    actions = ["activate_users", "deactivate_users"]
+
+    @admin.action(description="Activate selected users")
+    def activate_users(self, request, queryset):
+        with transaction.atomic():
+            user_ids = list(queryset.filter(is_active=False).values_list("id", flat=True))
+            for chunk in _chunks(user_ids):
+                User.objects.filter(id__in=chunk).update(is_active=True)
+            # Drop cached inactive states so their tokens work again.
+            transaction.on_commit(lambda: entitlements.invalidate(*user_ids))
+        updated = len(user_ids)
+        self.message_user(request, f"Activated {updated} users.")
+
+    @admin.action(description="Deactivate selected users and revoke their tokens")
+    def deactivate_users(self, request, queryset):
+        with transaction.atomic():
+            user_ids = list(queryset.filter(is_active=True).values_list("id", flat=True))
+            for chunk in _chunks(user_ids):
+                User.objects.filter(id__in=chunk).update(is_active=False)
+                entitlements.revoke(*chunk)
+        self.message_user(request, f"Deactivated {len(user_ids)} users.")
+
+
+@admin.register(Subscription)
+class SubscriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "user", "tool", "status", "updated_at")
+    list_select_related = ("user", "tool")
+    list_filter = ("status", "tool")
+    search_fields = ("user__username__exact",)
+    raw_id_fields = ("user",)
+    actions = ["cancel_subscriptions", "activate_subscriptions"]
+
+    def _set_status(self, queryset, status):
+        """Move the selected subscriptions to ``status`` with one UPDATE per chunk.
+
+        Returns the ids of the users whose subscriptions changed.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                queryset.exclude(status=status).select_for_update()
+                .values_list("id", "user_id", "tool_id", "status")
+            )
+            fields = {"status": status, "updated_at": now}
+            if status == "active":
+                # A manual grant is open-ended; a stale period end would have
+                # sweep_subscriptions expire it again.
+                fields.update(trial_ends_at=None, current_period_end=None)
+            for chunk in _chunks(rows):
+                Subscription.objects.filter(id__in=[row[0] for row in chunk]).update(**fields)
+            ledger.record([(user_id, tool_id, old, status) for _, user_id, tool_id, old in rows], source="admin")
+            user_ids = {row[1] for row in rows}
+            if status == "active":
+                transaction.on_commit(lambda: entitlements.invalidate(*user_ids))
+            else:
+                revoked = [row[1] for row in rows if row[3] == "active"]
+                for chunk in _chunks(list(set(revoked))):
+                    entitlements.revoke(*chunk)
+        return user_ids
+
+    @admin.action(description="Cancel selected subscriptions")
+    def cancel_subscriptions(self, request, queryset):
+        users = self._set_status(queryset, "canceled")
+        self.message_user(request, f"Canceled subscriptions for {len(users)} users.")
+
+    @admin.action(description="Activate selected subscriptions")
+    def activate_subscriptions(self, request, queryset):
+        users = self._set_status(queryset, "active")
+        self.message_user(request, f"Activated subscriptions for {len(users)} users.")
+
+
+@admin.register(Tool)
+class ToolAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "price_id", "is_active", "updated_at")
+    list_filter = ("is_active",)
+    search_fields = ("name",)
+    actions = ["enable_tools", "disable_tools"]
+
+    def _set_active(self, queryset, is_active):
+        # update() skips auto_now; bump updated_at so the catalog and the
+        # tool registry see a new version.
+        updated = queryset.exclude(is_active=is_active).update(is_active=is_active, updated_at=timezone.now())
+        transaction.on_commit(registry.invalidate)
+        return updated
+
+    @admin.action(description="Enable selected tools")
+    def enable_tools(self, request, queryset):
+        self.message_user(request, f"Enabled {self._set_active(queryset, True)} tools.")
+
+    @admin.action(description="Disable selected tools")
+    def disable_tools(self, request, queryset):
+        self.message_user(request, f"Disabled {self._set_active(queryset, False)} tools.")
+
+
+@admin.register(EntitlementEndpoint)
+class EntitlementEndpointAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "tool", "url", "is_active", "created_at")
+    list_filter = ("is_active",)
+    list_select_related = ("tool",)
+
+
+@admin.register(EntitlementNotification)
+class EntitlementNotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "endpoint", "user_id", "tool_id", "status", "attempts", "next_attempt_at", "last_error")
+    list_select_related = ("endpoint",)
+    raw_id_fields = ("user", "tool")
+
+
+@admin.register(UsageCounter)
+class UsageCounterAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "user_id", "tool_id", "bucket", "count")
+    raw_id_fields = ("user", "tool")
+
+
+@admin.register(StripeProduct)
+class StripeProductAdmin(admin.ModelAdmin):
+    list_display = ("stripe_id", "name", "active", "updated_at")
+    list_filter = ("active",)
+    search_fields = ("stripe_id", "name")
+
+
+@admin.register(StripePrice)
+class StripePriceAdmin(admin.ModelAdmin):
+    list_display = ("stripe_id", "product", "currency", "unit_amount", "interval", "active", "updated_at")
+    list_filter = ("active", "currency", "interval")
+    search_fields = ("stripe_id", "product")
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "event_id", "type", "created", "attempts", "next_attempt_at", "processed_at", "dead_at")
+    list_filter = (("dead_at", admin.EmptyFieldListFilter), ("processed_at", admin.EmptyFieldListFilter), "type")
+    search_fields = ("event_id__exact",)
+    actions = ["replay_events"]
 
-admin.site.register(User)
-admin.site.register(Subscription)
-admin.site.register(Tool)
+    @admin.action(description="Replay selected unprocessed events")
+    def replay_events(self, request, queryset):
+        replayed = queryset.filter(processed_at__isnull=True).update(
+            dead_at=None, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"Queued {replayed} events for process_webhooks.")
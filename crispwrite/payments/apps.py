@@ -5,3 +5,9 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        # Compile the email templates once at startup.
+        from . import emails  # noqa: F401
+        # Connect the signal handlers that keep the tool registry current.
+        from . import registry  # noqa: F401
@@ -0,0 +1,209 @@
+"""Async views routed instead of their DRF counterparts under ASGI.
+
+Password hashing (PBKDF2) runs in a small dedicated thread pool so it never
+blocks the event loop, and Stripe is called through the SDK's async HTTPX
+client. Semaphores bound how many hashes and Stripe calls may be running or
+queued; beyond that, requests get a fast 503 so that a burst, or a slow
+Stripe region, can't starve the other endpoints.
+"""
+import asyncio
+import json
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import httpx
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.idempotency import idempotent
+from .authentication import EntitlementJWTAuthentication
+from .models import User, Subscription
+from . import accounts, checkout, registry
+
+_hasher_pool = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHER_WORKERS, thread_name_prefix="password-hasher"
+)
+# Per event loop: semaphores by name, and the Stripe client.
+_slots = weakref.WeakKeyDictionary()
+_stripe_clients = weakref.WeakKeyDictionary()
+
+
+class Saturated(Exception):
+    """Too many calls of one kind are already running or queued."""
+
+
+@asynccontextmanager
+async def _slot(name, limit, timeout):
+    """Hold one of ``limit`` slots for ``name``, waiting at most ``timeout`` seconds."""
+    slots = _slots.setdefault(asyncio.get_running_loop(), {})
+    semaphore = slots.get(name)
+    if semaphore is None:
+        semaphore = slots[name] = asyncio.Semaphore(limit)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout)
+    except asyncio.TimeoutError:
+        raise Saturated
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+async def _hash(fn, *args):
+    """Run a password hashing call in the bounded hasher pool."""
+    async with _slot("hasher", settings.PASSWORD_HASHER_MAX_PENDING, settings.PASSWORD_HASHER_QUEUE_TIMEOUT):
+        return await asyncio.get_running_loop().run_in_executor(_hasher_pool, fn, *args)
+
+
+def _check_password(user, password):
+    """Return ``(valid, needs_upgrade)`` without touching the database.
+
+    Runs in the hasher pool, whose threads have no managed connection, so
+    the upgrade of an outdated hash is left to the caller.
+    """
+    outdated = []
+    valid = check_password(password, user.password, setter=outdated.append)
+    return valid, bool(outdated)
+
+
+def _stripe_client():
+    loop = asyncio.get_running_loop()
+    client = _stripe_clients.get(loop)
+    if client is None:
+        timeout = httpx.Timeout(settings.STRIPE_READ_TIMEOUT, connect=settings.STRIPE_CONNECT_TIMEOUT)
+        client = _stripe_clients[loop] = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY or "",
+            http_client=stripe.HTTPXClient(timeout=timeout),
+            base_addresses={"api": settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else None,
+            max_network_retries=0,
+        )
+    return client
+
+
+def _busy_response():
+    response = JsonResponse({"detail": "Server busy, please retry"}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _request_data(request):
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST
+
+
+@idempotent
+@csrf_exempt
+@require_POST
+async def register(request):
+    try:
+        data = _request_data(request)
+    except ValueError:
+        return JsonResponse({"error": "Malformed JSON"}, status=400)
+
+    error = accounts.validate_registration(data)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    if await User.objects.filter(username=data["email"]).aexists():
+        return JsonResponse({"error": accounts.DUPLICATE_EMAIL_ERROR}, status=400)
+
+    try:
+        password_hash = await _hash(make_password, data["password"])
+    except Saturated:
+        return _busy_response()
+
+    try:
+        await sync_to_async(accounts.create_inactive_user)(data, password_hash, request)
+    except IntegrityError:
+        # Lost a race with a concurrent signup for the same email.
+        return JsonResponse({"error": accounts.DUPLICATE_EMAIL_ERROR}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"detail": "Registration successful. Please check your email to activate your account."})
+
+
+@csrf_exempt
+@require_POST
+async def login(request):
+    try:
+        data = _request_data(request)
+    except ValueError:
+        return JsonResponse({"error": "Malformed JSON"}, status=400)
+    email = data.get("email")
+    password = data.get("password")
+    if not email or not password:
+        return JsonResponse({"detail": "Invalid credentials"}, status=401)
+
+    user = await User.objects.filter(username=email).afirst()
+    try:
+        if user is None:
+            # Hash anyway so response time doesn't reveal unknown emails.
+            await _hash(make_password, password)
+            valid = False
+        else:
+            valid, outdated = await _hash(_check_password, user, password)
+            if valid and outdated:
+                # What check_password's setter would save, but from the event
+                # loop's connection.
+                user.password = await _hash(make_password, password)
+                await User.objects.filter(pk=user.pk).aupdate(password=user.password)
+            valid = valid and user.is_active
+    except Saturated:
+        return _busy_response()
+
+    if not valid:
+        return JsonResponse({"detail": "Invalid credentials"}, status=401)
+    return JsonResponse(await sync_to_async(accounts.login_payload)(user))
+
+
+@idempotent
+@csrf_exempt
+@require_POST
+async def create_checkout(request):
+    try:
+        auth = await sync_to_async(EntitlementJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({"detail": str(e.detail)}, status=401)
+    if auth is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    user = auth[0]
+
+    try:
+        data = _request_data(request)
+    except ValueError:
+        return JsonResponse({"error": "Malformed JSON"}, status=400)
+    tool_input = data.get("tool_id")
+    if not tool_input:
+        return JsonResponse({"detail": "Missing tool_id"}, status=400)
+
+    tool = await sync_to_async(registry.get_tool)(tool_input)
+    if tool is None:
+        return JsonResponse({"detail": "Tool not found"}, status=404)
+    if await Subscription.objects.filter(user=user, tool_id=tool.id, status="active").aexists():
+        return JsonResponse({"detail": "Already subscribed"}, status=400)
+
+    async def create_session():
+        async with _slot("stripe", settings.STRIPE_MAX_IN_FLIGHT, settings.STRIPE_QUEUE_TIMEOUT):
+            return await _stripe_client().v1.checkout.sessions.create_async(checkout.session_params(user, tool))
+
+    try:
+        checkout_url = await checkout.aget_or_create_session_url(user.id, tool.id, create_session)
+    except (Saturated, stripe.APIConnectionError):
+        return _busy_response()
+    except checkout.CheckoutInProgress:
+        response = JsonResponse({"detail": "Checkout is already being created, please retry"}, status=409)
+        response["Retry-After"] = "1"
+        return response
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+    return JsonResponse({"checkout_url": checkout_url})
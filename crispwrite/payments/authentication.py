@@ -0,0 +1,79 @@
+import hmac
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from .tokens import VERSION_CLAIM
+from . import entitlements
+
+
+class EntitlementJWTAuthentication(JWTAuthentication):
+    """JWT authentication that rejects tokens with stale entitlement claims."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        version = validated_token.get(VERSION_CLAIM)
+        if version is not None and version != user.entitlements_version:
+            raise AuthenticationFailed(
+                _("Token entitlements are out of date"), code="entitlements_stale"
+            )
+        return user
+
+
+class CachedEntitlementJWTAuthentication(JWTStatelessUserAuthentication):
+    """Stateless JWT authentication checked against the cached user state.
+
+    Rejects inactive users and stale entitlement claims like
+    ``EntitlementJWTAuthentication``, but from ``entitlements.get_user_state``,
+    so a warm request costs a cache hit and no queries.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        state = entitlements.get_user_state(user.id)
+        if state is None or not state[0]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        version = validated_token.get(VERSION_CLAIM)
+        if version is not None and version != state[1]:
+            raise AuthenticationFailed(
+                _("Token entitlements are out of date"), code="entitlements_stale"
+            )
+        return user
+
+
+class ServiceUser:
+    """The caller of a service endpoint: one of our own tool backends."""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return f"service:{self.name}"
+
+
+class ServiceKeyAuthentication(BaseAuthentication):
+    """Authenticate backend-to-backend calls sent with ``Authorization: Service <key>``.
+
+    Keys are configured per calling service in ``settings.SERVICE_API_KEYS``.
+    """
+    keyword = "Service"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed(_("Invalid service key header"))
+        key = auth[1].decode("latin-1")
+        for name, expected in settings.SERVICE_API_KEYS.items():
+            if hmac.compare_digest(key, expected):
+                return ServiceUser(name), key
+        raise AuthenticationFailed(_("Invalid service key"))
+
+    def authenticate_header(self, request):
+        return self.keyword
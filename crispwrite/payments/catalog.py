@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Count, Max
+from rest_framework.renderers import JSONRenderer
+
+from .models import StripePrice, StripeProduct, Tool
+from .serializers import ToolSerializer
+from . import pricing
+
+CACHE_KEY = "catalog:{version}"
+LAST_GOOD_KEY = "catalog:last-good"
+
+# A rendered tool catalog. ``body`` is the JSON payload served as is.
+Catalog = namedtuple("Catalog", "version etag last_modified body")
+
+_lock = threading.Lock()
+_local = {"catalog": None, "checked_at": 0.0, "checking": False}
+
+
+def current_version():
+    """Return the catalog version string and when the catalog last changed.
+
+    Both cover the tools and the mirrored Stripe prices and products, so a
+    price change is served like a tool change.
+    """
+    parts, last_modified = [], None
+    for model in (Tool, StripePrice, StripeProduct):
+        state = model.objects.aggregate(last_modified=Max("updated_at"), count=Count("id"))
+        parts.append(f"{state['last_modified'].isoformat() if state['last_modified'] else '-'}:{state['count']}")
+        if state["last_modified"] and (last_modified is None or state["last_modified"] > last_modified):
+            last_modified = state["last_modified"]
+    return "|".join(parts), last_modified
+
+
+def _render(version, last_modified):
+    tools = list(Tool.objects.all())
+    prices = pricing.prices_by_id({tool.price_id for tool in tools})
+    body = JSONRenderer().render(ToolSerializer(tools, many=True, context={"prices": prices}).data)
+    etag = hashlib.md5(body, usedforsecurity=False).hexdigest()
+    return Catalog(version, etag, last_modified, body)
+
+
+def _refresh(current):
+    version, last_modified = current_version()
+    if current is None or current.version != version:
+        current = cache.get(CACHE_KEY.format(version=version))
+        if current is None:
+            current = _render(version, last_modified)
+            cache.set(CACHE_KEY.format(version=version), current, 86400)
+        cache.set(LAST_GOOD_KEY, current, None)
+    return current
+
+
+def get_catalog():
+    """Return the pre-rendered tool catalog.
+
+    The catalog version (latest ``Tool.updated_at`` plus the row count) is
+    re-read at most every ``CATALOG_VERSION_CHECK_INTERVAL`` seconds, so most
+    calls are served from process memory without touching the database or
+    the shared cache. One thread re-reads it while the others keep serving
+    the catalog they have, and the lock is never held over the query. When
+    the database is unreachable the last good catalog is returned instead,
+    and the next check waits out the interval like a successful one;
+    DatabaseError is only raised if there is no catalog at all.
+    """
+    current = _local["catalog"]
+    if current and time.monotonic() - _local["checked_at"] < settings.CATALOG_VERSION_CHECK_INTERVAL:
+        return current
+
+    with _lock:
+        now = time.monotonic()
+        if current and (now - _local["checked_at"] < settings.CATALOG_VERSION_CHECK_INTERVAL or _local["checking"]):
+            return current
+        _local["checking"] = True
+        _local["checked_at"] = now
+
+    try:
+        current = _refresh(current)
+    except DatabaseError:
+        current = current or cache.get(LAST_GOOD_KEY)
+        if current is None:
+            raise
+    else:
+        _local["catalog"] = current
+    finally:
+        _local["checking"] = False
+    return current
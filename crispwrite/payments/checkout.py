@@ -0,0 +1,120 @@
+import asyncio
+import time
+import uuid
+
+from django.core.cache import cache
+
+SESSION_KEY = "checkout:{user_id}:{tool_id}"
+LOCK_KEY = "checkout-lock:{user_id}:{tool_id}"
+
+# Stop handing out a session this many seconds before Stripe expires it, so
+# the customer has time to finish paying.
+EXPIRY_MARGIN = 600
+# Upper bound on how long one Stripe session create may hold the lock, and
+# so on how long a duplicate request waits for it.
+LOCK_TIMEOUT = 15
+POLL_INTERVAL = 0.05
+# Every new subscription starts with a free trial of this many days.
+TRIAL_PERIOD_DAYS = 7
+
+
+def session_params(user, tool):
+    """Stripe Checkout Session parameters for ``user`` subscribing to ``tool``.
+
+    A returning customer is passed by ID so Stripe doesn't create another
+    one. ``client_reference_id`` lets the webhook find the user by key.
+    """
+    params = {
+        "client_reference_id": str(user.id),
+        "payment_method_types": ["card"],
+        "line_items": [{
+            "price": tool.price_id,
+            "quantity": 1
+        }],
+        "mode": "subscription",
+        "subscription_data": {"trial_period_days": TRIAL_PERIOD_DAYS},
+        "success_url": "https://marketplace.crispai.ca/?status=success&session_id={CHECKOUT_SESSION_ID}",
+        "cancel_url": "http://localhost:8080/cancel",
+        "metadata": {"tool_id": str(tool.id)}
+    }
+    if user.stripe_customer_id:
+        params["customer"] = user.stripe_customer_id
+    else:
+        params["customer_email"] = user.email
+    return params
+
+
+class CheckoutInProgress(Exception):
+    """Another request for the same session held the lock past ``LOCK_TIMEOUT``."""
+
+
+def _release(lock_key, token):
+    # Only drop the lock if it is still ours: it may have timed out and been
+    # taken by another request.
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def get_or_create_session_url(user_id, tool_id, create):
+    """Return the checkout URL of the user's open session for a tool.
+
+    ``create`` makes a new Stripe Checkout Session and is only called when
+    there is no reusable one. Concurrent duplicate requests (double clicks,
+    reloads) are coalesced: the one holding the lock calls Stripe while the
+    others wait for its result, and take the lock over if it fails. Raises
+    CheckoutInProgress if the lock is still held after ``LOCK_TIMEOUT``.
+    """
+    key = SESSION_KEY.format(user_id=user_id, tool_id=tool_id)
+    lock_key = LOCK_KEY.format(user_id=user_id, tool_id=tool_id)
+    token = uuid.uuid4().hex
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        url = cache.get(key)
+        if url:
+            return url
+        if cache.add(lock_key, token, LOCK_TIMEOUT):
+            break
+        if time.monotonic() >= deadline:
+            raise CheckoutInProgress
+        time.sleep(POLL_INTERVAL)
+    try:
+        session = create()
+        ttl = int(session.expires_at - time.time()) - EXPIRY_MARGIN
+        if ttl > 0:
+            cache.set(key, session.url, ttl)
+        return session.url
+    finally:
+        _release(lock_key, token)
+
+
+async def aget_or_create_session_url(user_id, tool_id, create):
+    """Async counterpart of ``get_or_create_session_url``; ``create`` is awaited."""
+    key = SESSION_KEY.format(user_id=user_id, tool_id=tool_id)
+    lock_key = LOCK_KEY.format(user_id=user_id, tool_id=tool_id)
+    token = uuid.uuid4().hex
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        url = await cache.aget(key)
+        if url:
+            return url
+        if await cache.aadd(lock_key, token, LOCK_TIMEOUT):
+            break
+        if time.monotonic() >= deadline:
+            raise CheckoutInProgress
+        await asyncio.sleep(POLL_INTERVAL)
+    try:
+        session = await create()
+        ttl = int(session.expires_at - time.time()) - EXPIRY_MARGIN
+        if ttl > 0:
+            await cache.aset(key, session.url, ttl)
+        return session.url
+    finally:
+        if await cache.aget(lock_key) == token:
+            await cache.adelete(lock_key)
+
+
+def forget_session(user_id, tool_id):
+    """Stop reusing a session once it has been completed or has expired."""
+    cache.delete(SESSION_KEY.format(user_id=user_id, tool_id=tool_id))
@@ -0,0 +1,4 @@
+from api.emails import EmailTemplate
+
+ACTIVATION = EmailTemplate("🎉 Welcome to CRISP AI – Let’s Build the Future Together!", "activation")
+INVITATION = EmailTemplate("You're invited to CRISP AI", "invitation")
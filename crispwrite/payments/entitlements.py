@@ -0,0 +1,125 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Subscription, User
+
+CACHE_KEY = "entitlements:{user_id}"
+STATE_CACHE_KEY = "entitlements:state:{user_id}"
+
+
+def _key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def _state_key(user_id):
+    return STATE_CACHE_KEY.format(user_id=user_id)
+
+
+def get_user_state(user_id):
+    """Return ``(is_active, entitlements_version)`` for a user, or None if unknown.
+
+    Cached like the tool set and dropped with it by ``invalidate``, so
+    stateless token checks can reject deactivated users and stale tokens
+    without a query.
+    """
+    state = cache.get(_state_key(user_id))
+    if state is None:
+        state = (
+            User.objects.filter(pk=user_id).values_list("is_active", "entitlements_version").first()
+            or (False, None)
+        )
+        cache.set(_state_key(user_id), state, settings.ENTITLEMENT_CACHE_TIMEOUT)
+    return None if state[1] is None else state
+
+
+def get_active_tool_ids(user_id):
+    """Return the IDs of the tools a user is actively subscribed to.
+
+    Served from the cache; a miss costs a single query over the
+    subscription table and repopulates the cached set.
+    """
+    tool_ids = cache.get(_key(user_id))
+    if tool_ids is None:
+        tool_ids = frozenset(
+            Subscription.objects.filter(user_id=user_id, status="active")
+            .values_list("tool_id", flat=True)
+        )
+        cache.set(_key(user_id), tool_ids, settings.ENTITLEMENT_CACHE_TIMEOUT)
+    return tool_ids
+
+
+def get_many(user_ids, chunk_size=1000):
+    """Return ``{user_id: frozenset(tool_ids)}`` for many users at once.
+
+    Cached sets are read with one ``get_many``; the misses are loaded with
+    one query per ``chunk_size`` users and written back to the cache.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    cached = cache.get_many([_key(user_id) for user_id in user_ids])
+    result = {user_id: cached[_key(user_id)] for user_id in user_ids if _key(user_id) in cached}
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        loaded = {user_id: set() for user_id in chunk}
+        for user_id, tool_id in Subscription.objects.filter(user_id__in=chunk, status="active").values_list(
+            "user_id", "tool_id"
+        ):
+            loaded[user_id].add(tool_id)
+        loaded = {user_id: frozenset(tool_ids) for user_id, tool_ids in loaded.items()}
+        cache.set_many({_key(user_id): tool_ids for user_id, tool_ids in loaded.items()}, settings.ENTITLEMENT_CACHE_TIMEOUT)
+        result.update(loaded)
+    return result
+
+
+def lookup(identifiers, by="user_id", tool_id=None, chunk_size=1000):
+    """Yield an entitlement record per user ID or email, in input order.
+
+    Emails are matched against the username (registration stores the email
+    there), which unlike the email column is indexed. Unknown emails come
+    back with ``user_id`` None. With ``tool_id`` only that tool is reported.
+    Work is done ``chunk_size`` identifiers at a time, so this can feed a
+    streamed response.
+    """
+    for start in range(0, len(identifiers), chunk_size):
+        chunk = identifiers[start:start + chunk_size]
+        if by == "email":
+            user_ids = dict(User.objects.filter(username__in=chunk).values_list("username", "id"))
+        else:
+            user_ids = {user_id: user_id for user_id in chunk}
+        tools = get_many([user_id for user_id in user_ids.values()])
+        for identifier in chunk:
+            user_id = user_ids.get(identifier)
+            tool_ids = tools.get(user_id, frozenset())
+            if tool_id is not None:
+                tool_ids = tool_ids & {tool_id}
+            record = {"user_id": user_id, "has_access": bool(tool_ids), "tools": sorted(tool_ids)}
+            if by == "email":
+                record["email"] = identifier
+            yield record
+
+
+def invalidate(*user_ids):
+    """Drop the cached entitlements of the given users after a write."""
+    cache.delete_many([key for user_id in user_ids for key in (_key(user_id), _state_key(user_id))])
+
+
+def _revoke(user_ids):
+    User.objects.filter(pk__in=user_ids).update(
+        entitlements_version=F("entitlements_version") + 1
+    )
+    invalidate(*user_ids)
+
+
+def revoke(*user_ids):
+    """Invalidate cached entitlements and any tokens that embed them.
+
+    Call after an entitlement is taken away; bumping the version makes
+    access tokens issued before now fail authentication. Both happen once
+    the current transaction commits, so nothing re-caches or re-issues the
+    old entitlements from rows that aren't committed yet.
+    """
+    transaction.on_commit(partial(_revoke, user_ids))
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import SubscriptionEvent, SubscriptionSnapshot, SubscriptionSnapshotEntry
+from . import notifications
+
+# Snapshots stop this far in the past, so a write whose transaction was
+# still open when the snapshot was taken is not left out of it.
+SNAPSHOT_LAG = timedelta(minutes=5)
+BATCH_SIZE = 5000
+
+
+def record(changes, source):
+    """Append ``(user_id, tool_id, old_status, status)`` changes to the ledger.
+
+    Call this in the transaction that writes the subscriptions, so the
+    ledger and the table cannot disagree. ``old_status`` is "" for a
+    subscription created by the change. Rows go in with one executemany
+    rather than through model instances, which dominate bulk_create on
+    sweeps of thousands of rows. The changes are also queued for the tool
+    backends that subscribe to them.
+    """
+    changes = list(changes)
+    connection = connections[router.db_for_write(SubscriptionEvent)]
+    occurred_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    table = connection.ops.quote_name(SubscriptionEvent._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (user_id, tool_id, old_status, status, source, occurred_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                (user_id, tool_id, old_status, status, source, occurred_at)
+                for user_id, tool_id, old_status, status in changes
+            ],
+        )
+    notifications.queue(changes)
+
+
+def _latest_snapshot(at):
+    return SubscriptionSnapshot.objects.filter(taken_at__lte=at).order_by("-taken_at").first()
+
+
+def _replay(events):
+    """Return the last status of each (user_id, tool_id) in ``events``."""
+    latest = {}
+    for user_id, tool_id, status in events.order_by("occurred_at", "id").values_list("user_id", "tool_id", "status"):
+        latest[(user_id, tool_id)] = status
+    return latest
+
+
+def state_at(at, tool_id=None):
+    """Return ``{(user_id, tool_id): status}`` as it stood at ``at``.
+
+    Reads the newest snapshot taken before ``at`` and replays only the
+    ledger events after it.
+    """
+    snapshot = _latest_snapshot(at)
+    events = SubscriptionEvent.objects.filter(occurred_at__lte=at)
+    state = {}
+    if snapshot is not None:
+        events = events.filter(occurred_at__gt=snapshot.taken_at)
+        entries = snapshot.entries.all()
+        if tool_id is not None:
+            entries = entries.filter(tool_id=tool_id)
+        for user_id, entry_tool_id, status in entries.values_list("user_id", "tool_id", "status").iterator(BATCH_SIZE):
+            state[(user_id, entry_tool_id)] = status
+    if tool_id is not None:
+        events = events.filter(tool_id=tool_id)
+    state.update(_replay(events))
+    return state
+
+
+def active_at(at, tool_id=None):
+    """Return the ``(user_id, tool_id)`` pairs with an active subscription at ``at``."""
+    snapshot = _latest_snapshot(at)
+    if snapshot is None:
+        return {pair for pair, status in state_at(at, tool_id).items() if status == "active"}
+
+    events = SubscriptionEvent.objects.filter(occurred_at__gt=snapshot.taken_at, occurred_at__lte=at)
+    entries = snapshot.entries.filter(status="active")
+    if tool_id is not None:
+        events = events.filter(tool_id=tool_id)
+        entries = entries.filter(tool_id=tool_id)
+    active = set(entries.values_list("user_id", "tool_id").iterator(BATCH_SIZE))
+    for pair, status in _replay(events).items():
+        if status == "active":
+            active.add(pair)
+        else:
+            active.discard(pair)
+    return active
+
+
+def churn_by_tool(start, end):
+    """Count subscriptions that stopped being active in ``[start, end)``, per tool id."""
+    return dict(
+        SubscriptionEvent.objects.filter(occurred_at__gte=start, occurred_at__lt=end, old_status="active")
+        .exclude(status="active")
+        .values_list("tool_id")
+        .annotate(count=Count("id"))
+    )
+
+
+def take_snapshot(taken_at=None):
+    """Compact the ledger into a snapshot at ``taken_at``.
+
+    Defaults to ``SNAPSHOT_LAG`` ago. The previous snapshot is streamed and
+    merged with the events since, so memory is bounded by that delta.
+    """
+    taken_at = taken_at or timezone.now() - SNAPSHOT_LAG
+    previous = _latest_snapshot(taken_at)
+    events = SubscriptionEvent.objects.filter(occurred_at__lte=taken_at)
+    if previous is not None:
+        events = events.filter(occurred_at__gt=previous.taken_at)
+    delta = _replay(events)
+
+    with transaction.atomic():
+        snapshot = SubscriptionSnapshot.objects.create(taken_at=taken_at)
+        batch = []
+
+        def add(user_id, tool_id, status):
+            batch.append(SubscriptionSnapshotEntry(snapshot=snapshot, user_id=user_id, tool_id=tool_id, status=status))
+            if len(batch) >= BATCH_SIZE:
+                SubscriptionSnapshotEntry.objects.bulk_create(batch)
+                batch.clear()
+
+        if previous is not None:
+            for user_id, tool_id, status in (
+                previous.entries.values_list("user_id", "tool_id", "status").iterator(BATCH_SIZE)
+            ):
+                add(user_id, tool_id, delta.pop((user_id, tool_id), status))
+        for (user_id, tool_id), status in delta.items():
+            add(user_id, tool_id, status)
+        SubscriptionSnapshotEntry.objects.bulk_create(batch)
+    return snapshot
+
+
+def prune_snapshots(keep):
+    """Delete all but the newest ``keep`` snapshots. The ledger itself is kept."""
+    stale = SubscriptionSnapshot.objects.order_by("-taken_at").values_list("id", flat=True)[keep:]
+    deleted = SubscriptionSnapshot.objects.filter(id__in=list(stale)).delete()[1]
+    return deleted.get(SubscriptionSnapshot._meta.label, 0)
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Subscription
+from . import entitlements, ledger
+
+# How long past the end of its period an active subscription is left alone,
+# giving the renewal webhook time to arrive before access is taken away.
+GRACE_PERIOD = timedelta(days=1)
+
+
+def sweep_expired(now=None, grace=GRACE_PERIOD, chunk_size=1000):
+    """Expire active subscriptions whose current period ended before ``now - grace``.
+
+    Relies on every writer that sets a subscription active also setting its
+    period, from Stripe where it is known (webhooks, reconcile) and to null
+    otherwise (admin activation, seat provisioning). Null periods are never
+    swept.
+
+    A subscription whose period never went past its trial becomes
+    ``trial_expired``; any other becomes ``expired``. Rows are taken oldest
+    first, ``chunk_size`` at a time, from the (status, period end) index,
+    and each chunk is one short transaction of set-based
+    UPDATEs plus its ledger events. Yields ``(trial_expired, expired)``
+    counts per chunk.
+    """
+    cutoff = (now or timezone.now()) - grace
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Subscription.objects.select_for_update(skip_locked=True)
+                .filter(status="active", current_period_end__lt=cutoff)
+                .order_by("current_period_end", "id")
+                .values_list("id", "user_id", "tool_id", "trial_ends_at", "current_period_end")[:chunk_size]
+            )
+            if not rows:
+                return
+
+            changes = {"trial_expired": [], "expired": []}
+            for row in rows:
+                _, _, _, trial_ends_at, period_end = row
+                changes["trial_expired" if trial_ends_at and period_end <= trial_ends_at else "expired"].append(row)
+
+            updated_at = timezone.now()
+            for status, changed in changes.items():
+                if changed:
+                    Subscription.objects.filter(id__in=[row[0] for row in changed]).update(
+                        status=status, updated_at=updated_at
+                    )
+                    ledger.record(
+                        [(user_id, tool_id, "active", status) for _, user_id, tool_id, _, _ in changed],
+                        source="sweep",
+                    )
+            entitlements.revoke(*{row[1] for row in rows})
+        yield len(changes["trial_expired"]), len(changes["expired"])
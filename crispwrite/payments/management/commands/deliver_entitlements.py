@@ -0,0 +1,34 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from payments import notifications
+
+
+class Command(BaseCommand):
+    help = "Push queued entitlement changes to the registered tool endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling the queue instead of exiting once nothing is due.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="Seconds to sleep between polls when nothing is due.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        with requests.Session() as session:
+            while True:
+                count = notifications.deliver_pending(session, options["batch_size"])
+                total += count
+                if count:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} entitlement notifications"))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments import webhooks
+
+
+class Command(BaseCommand):
+    help = "Apply Stripe events stored in the webhook inbox, oldest first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling the inbox instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="Seconds to sleep between polls of an empty inbox.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = webhooks.process_pending(options["batch_size"], options["max_attempts"])
+            total += count
+            if count:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} webhook events"))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments import accounts
+
+
+class Command(BaseCommand):
+    help = "Delete accounts that were never activated, in small primary key ranges."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=7,
+            help="Only purge accounts that registered more than this many days ago.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Count the accounts that would be purged without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        if options["dry_run"]:
+            count = accounts.never_activated(cutoff).count()
+            self.stdout.write(f"{count} never-activated accounts older than {options['days']} days")
+            return
+
+        total = 0
+        for last_pk, deleted in accounts.purge_never_activated(cutoff, options["chunk_size"]):
+            total += deleted
+            if deleted:
+                self.stdout.write(f"Deleted {deleted} accounts up to id {last_pk} ({total} so far)")
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} never-activated accounts"))
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from payments.reconcile import Reconciler
+
+
+class Command(BaseCommand):
+    help = (
+        "Repair Subscription rows from a Stripe export (JSONL of subscription "
+        "objects, checkout sessions or events). Use '-' to read stdin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Report what would change without writing anything.",
+        )
+
+    def handle(self, *args, **options):
+        reconciler = Reconciler(chunk_size=options["chunk_size"], dry_run=options["dry_run"])
+        if options["path"] == "-":
+            stats = reconciler.run(sys.stdin)
+        else:
+            with open(options["path"], encoding="utf-8") as export:
+                stats = reconciler.run(export)
+
+        prefix = "Would apply" if options["dry_run"] else "Applied"
+        self.stdout.write(
+            f"{prefix}: {stats['created']} created, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged ({stats['read']} records read)"
+        )
+        for reason, count in sorted(stats.items()):
+            if reason.startswith("skipped_"):
+                self.stdout.write(f"  {reason.replace('_', ' ')}: {count}")
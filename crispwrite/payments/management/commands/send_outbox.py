@@ -0,0 +1,35 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from payments import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbound emails over a single long-lived mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--max-attempts", type=int, default=8)
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling the outbox instead of exiting once nothing is due.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=2.0,
+            help="Seconds to sleep between polls when nothing is due.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        with get_connection() as connection:
+            while True:
+                count = outbox.send_pending(connection, options["batch_size"], options["max_attempts"])
+                total += count
+                if count:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} outbound emails"))
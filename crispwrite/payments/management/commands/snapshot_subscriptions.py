@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from payments import ledger
+
+
+class Command(BaseCommand):
+    help = "Compact the subscription ledger into a new point-in-time snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep", type=int, default=30,
+            help="Number of most recent snapshots to keep; older ones are deleted.",
+        )
+
+    def handle(self, *args, **options):
+        snapshot = ledger.take_snapshot()
+        pruned = ledger.prune_snapshots(options["keep"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot at {snapshot.taken_at:%Y-%m-%d %H:%M:%S} with {snapshot.entries.count()} entries; "
+            f"pruned {pruned} old snapshots"
+        ))
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from payments import lifecycle
+
+
+class Command(BaseCommand):
+    help = "Expire active subscriptions whose trial or billing period has run out."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--grace-hours", type=float, default=lifecycle.GRACE_PERIOD.total_seconds() / 3600,
+            help="Leave subscriptions alone for this long after their period ends.",
+        )
+
+    def handle(self, *args, **options):
+        trials = expired = 0
+        for trial_count, expired_count in lifecycle.sweep_expired(
+            grace=timedelta(hours=options["grace_hours"]), chunk_size=options["chunk_size"]
+        ):
+            trials += trial_count
+            expired += expired_count
+            self.stdout.write(f"{trials} trials and {expired} paid periods expired so far")
+        self.stdout.write(self.style.SUCCESS(f"Expired {trials} trials and {expired} paid subscriptions"))
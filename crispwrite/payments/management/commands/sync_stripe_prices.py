@@ -0,0 +1,18 @@
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments import pricing
+
+
+class Command(BaseCommand):
+    help = "Re-read every Stripe product and price into the local pricing mirror."
+
+    def handle(self, *args, **options):
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        stats = pricing.sync(
+            (product.to_dict() for product in stripe.Product.list(limit=100).auto_paging_iter()),
+            (price.to_dict() for price in stripe.Price.list(limit=100).auto_paging_iter()),
+        )
+        for kind, (changed, deleted) in stats.items():
+            self.stdout.write(f"{kind}: {changed} changed, {deleted} deleted")
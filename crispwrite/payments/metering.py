@@ -0,0 +1,189 @@
+"""Write-combining usage counters for quotas and billing.
+
+``record`` only adds to a dict in this process. A background thread flushes
+it every ``METERING_FLUSH_INTERVAL`` seconds as one batched upsert into
+hourly ``UsageCounter`` rows, so the database sees one write per (user,
+tool, hour) per interval however many events there were.
+
+Loss on crash: an event is durable once it has been flushed. A process that
+dies without running its exit hooks (SIGKILL, the OOM killer, a hard crash)
+loses what it recorded since its last flush, at most
+``METERING_FLUSH_INTERVAL`` seconds of its events. A flush that fails puts
+its counts back to go out with the next one. A clean shutdown flushes from
+an atexit hook.
+
+Quota checks read an in-memory view: the database total for the current
+calendar month, reloaded at most every ``METERING_QUOTA_REFRESH`` seconds,
+plus what this process has recorded since. Usage recorded by other
+processes shows up on the next reload, so a quota can be overshot by what
+they record in between.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import UsageCounter
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_start(at):
+    """Start of the hour ``at`` is counted in."""
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def period_start(at):
+    """Start of the calendar month quotas are counted over."""
+    return at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _upsert(rows):
+    connection = connections[router.db_for_write(UsageCounter)]
+    table = connection.ops.quote_name(UsageCounter._meta.db_table)
+    count = connection.ops.quote_name("count")
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (user_id, tool_id, bucket, {count}) VALUES (%s, %s, %s, %s) "
+            f"ON CONFLICT (user_id, tool_id, bucket) DO UPDATE SET {count} = {table}.{count} + excluded.{count}",
+            [
+                (user_id, tool_id, connection.ops.adapt_datetimefield_value(bucket), amount)
+                for user_id, tool_id, bucket, amount in rows
+            ],
+        )
+
+
+class Meter:
+    """Per-process usage accumulator; use the module-level functions."""
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        # Serializes flushes with quota reloads, so a reload sees each
+        # event either in the database or still pending, never neither.
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (user_id, tool_id) -> Counter({bucket: count})
+        self._totals = {}  # (user_id, tool_id) -> [period, loaded_at, count]
+        self._thread = None
+
+    def _check_fork(self):
+        # A process forked from one that had already started metering gets
+        # fresh state: the parent's thread and locks don't carry over.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _ensure_flusher(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="usage-meter", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(settings.METERING_FLUSH_INTERVAL)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Usage flush failed; counts kept for the next one")
+
+    def record(self, user_id, tool_id, count=1, at=None):
+        bucket = bucket_start(at or timezone.now())
+        self._check_fork()
+        with self._lock:
+            self._ensure_flusher()
+            self._pending.setdefault((user_id, tool_id), Counter())[bucket] += count
+            total = self._totals.get((user_id, tool_id))
+            if total is not None and bucket >= total[0]:
+                total[2] += count
+
+    def usage(self, user_id, tool_id, now=None):
+        now = now or timezone.now()
+        period = period_start(now)
+        key = (user_id, tool_id)
+        self._check_fork()
+        with self._lock:
+            total = self._totals.get(key)
+            fresh = total is not None and time.monotonic() - total[1] < settings.METERING_QUOTA_REFRESH
+            if fresh and total[0] == period:
+                return total[2]
+
+        with self._flush_lock:
+            stored = (
+                UsageCounter.objects.filter(user_id=user_id, tool_id=tool_id, bucket__gte=period)
+                .aggregate(total=Sum("count"))["total"] or 0
+            )
+            with self._lock:
+                pending = sum(
+                    amount for bucket, amount in self._pending.get(key, {}).items() if bucket >= period
+                )
+                self._totals[key] = [period, time.monotonic(), stored + pending]
+                return stored + pending
+
+    def flush(self):
+        """Write the pending counts; returns the number of counter rows touched."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                # Drop quota views that would be reloaded anyway.
+                stale = time.monotonic() - settings.METERING_QUOTA_REFRESH
+                self._totals = {key: total for key, total in self._totals.items() if total[1] >= stale}
+            rows = sorted(
+                (user_id, tool_id, bucket, amount)
+                for (user_id, tool_id), buckets in pending.items()
+                for bucket, amount in buckets.items()
+            )
+            if not rows:
+                return 0
+            try:
+                _upsert(rows)
+            except Exception:
+                with self._lock:
+                    for key, buckets in pending.items():
+                        self._pending.setdefault(key, Counter()).update(buckets)
+                raise
+            return len(rows)
+
+
+_meter = Meter()
+
+
+def record(user_id, tool_id, count=1, at=None):
+    """Count ``count`` uses of a tool by a user. Never touches the database."""
+    _meter.record(user_id, tool_id, count, at)
+
+
+def usage(user_id, tool_id, now=None):
+    """Uses of the tool by the user this calendar month, from the in-memory view."""
+    return _meter.usage(user_id, tool_id, now)
+
+
+def within_quota(user_id, tool_id, limit, count=1):
+    """Whether ``count`` more uses would stay within ``limit`` for this month."""
+    return usage(user_id, tool_id) + count <= limit
+
+
+def flush():
+    """Write this process's pending counts now."""
+    return _meter.flush()
+
+
+def totals(start, end, tool_id=None):
+    """Flushed usage in ``[start, end)`` as ``{(user_id, tool_id): count}``, for billing."""
+    counters = UsageCounter.objects.filter(bucket__gte=start, bucket__lt=end)
+    if tool_id is not None:
+        counters = counters.filter(tool_id=tool_id)
+    return {
+        (user_id, counter_tool_id): total
+        for user_id, counter_tool_id, total in counters.values_list("user_id", "tool_id").annotate(total=Sum("count"))
+    }
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    """Start the ledger with one event per existing subscription."""
+    Subscription = apps.get_model('payments', 'Subscription')
+    SubscriptionEvent = apps.get_model('payments', 'SubscriptionEvent')
+    batch = []
+    for user_id, tool_id, status, updated_at in (
+        Subscription.objects.order_by('id').values_list('user_id', 'tool_id', 'status', 'updated_at').iterator()
+    ):
+        batch.append(SubscriptionEvent(
+            user_id=user_id, tool_id=tool_id, status=status, source='backfill', occurred_at=updated_at,
+        ))
+        if len(batch) >= 5000:
+            SubscriptionEvent.objects.bulk_create(batch)
+            batch = []
+    SubscriptionEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SubscriptionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_status', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(max_length=50)),
+                ('source', models.CharField(max_length=50)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tool', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='payments.tool')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['occurred_at', 'id'], name='subevent_occurred_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SubscriptionSnapshotEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=50)),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='payments.subscriptionsnapshot')),
+                ('tool', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='payments.tool')),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['snapshot', 'status', 'tool'], name='subsnapshot_status_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
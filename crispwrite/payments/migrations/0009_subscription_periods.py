@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_stripe_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='current_period_end',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='trial_ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['status', 'current_period_end', 'id'], name='sub_status_period_end_idx'),
+        ),
+    ]
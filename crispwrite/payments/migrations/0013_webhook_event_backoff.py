@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_stripe_price_mirror'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='webhookevent',
+            name='webhookevent_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='dead_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('dead_at__isnull', True), ('processed_at__isnull', True)), fields=['created', 'id'], name='webhookevent_pending_idx'),
+        ),
+    ]
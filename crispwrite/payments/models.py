@@ -1,11 +1,23 @@
+import secrets
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class User(AbstractUser):
     phone = models.CharField(max_length=20, null=True, blank=True)
     role = models.CharField(max_length=20, default='user')
     is_active = models.BooleanField(default=False)
+    # Bumped whenever an entitlement is revoked so that access tokens carrying
+    # entitlement claims issued before the revocation stop being accepted.
+    entitlements_version = models.PositiveIntegerField(default=0)
+    # Set from the first completed checkout; later checkouts reuse the customer.
+    stripe_customer_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["is_active", "date_joined"], name="user_active_joined_idx"),
+        ]
 
 class Tool(models.Model):
     name = models.CharField(max_length=100)
@@ -23,8 +35,223 @@ class Subscription(models.Model):
     tool = models.ForeignKey(Tool, on_delete=models.CASCADE)
     status = models.CharField(max_length=50)
     email = models.EmailField()
+    stripe_subscription_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    # When the free trial ends and when the current paid (or trial) period
+    # ends. Kept current by Stripe webhooks; sweep_subscriptions expires
+    # active rows whose period has run out.
+    trial_ends_at = models.DateTimeField(null=True, blank=True)
+    current_period_end = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status"], name="sub_user_status_idx"),
+            models.Index(fields=["user", "tool", "status"], name="sub_user_tool_status_idx"),
+            models.Index(fields=["status", "tool"], name="sub_status_tool_idx"),
+            models.Index(fields=["status", "current_period_end", "id"], name="sub_status_period_end_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tool"], name="unique_subscription_user_tool"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.tool.name}"
+
+class WebhookEvent(models.Model):
+    """Verified Stripe event waiting to be applied by ``process_webhooks``."""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set once the event has failed ``max_attempts`` times; replayed from the admin.
+    dead_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created", "id"],
+                condition=models.Q(processed_at__isnull=True, dead_at__isnull=True),
+                name="webhookevent_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} - {self.type}"
+
+
+class OutboundEmail(models.Model):
+    """Email queued in the sender's transaction and delivered by ``send_outbox``."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at", "id"],
+                condition=models.Q(status="pending"),
+                name="outboundemail_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} - {', '.join(self.to)}"
+
+
+class SubscriptionEvent(models.Model):
+    """A subscription status change, appended next to every write.
+
+    Rows are never updated or deleted, and they outlive the user and tool
+    they describe, so the foreign keys carry no database constraint.
+    """
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    tool = models.ForeignKey(Tool, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    # Empty when the subscription was created by this change.
+    old_status = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=50)
+    source = models.CharField(max_length=50)
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["occurred_at", "id"], name="subevent_occurred_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}/{self.tool_id}: {self.old_status or '-'} -> {self.status}"
+
+
+class SubscriptionSnapshot(models.Model):
+    """Every (user, tool) status as of ``taken_at``, compacted from the ledger."""
+    taken_at = models.DateTimeField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Snapshot at {self.taken_at}"
+
+
+class SubscriptionSnapshotEntry(models.Model):
+    snapshot = models.ForeignKey(SubscriptionSnapshot, on_delete=models.CASCADE, related_name='entries')
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    tool = models.ForeignKey(Tool, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    status = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["snapshot", "status", "tool"], name="subsnapshot_status_idx"),
+        ]
+
+
+def _endpoint_secret():
+    return secrets.token_urlsafe(32)
+
+
+class EntitlementEndpoint(models.Model):
+    """A tool backend that is sent entitlement changes instead of polling for them."""
+    name = models.CharField(max_length=100)
+    # Leave empty to receive the changes of every tool.
+    tool = models.ForeignKey(Tool, on_delete=models.CASCADE, null=True, blank=True)
+    url = models.URLField()
+    # Signs each callback; see payments.notifications.signature.
+    secret = models.CharField(max_length=100, default=_endpoint_secret)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.url}"
+
+
+class EntitlementNotification(models.Model):
+    """The latest undelivered status of one (user, tool) for one endpoint.
+
+    A change to a pair that is still waiting overwrites the row, so each
+    callback carries only the last state of everything that changed.
+    """
+    endpoint = models.ForeignKey(EntitlementEndpoint, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, related_name='+')
+    tool = models.ForeignKey(Tool, on_delete=models.CASCADE, db_index=False, related_name='+')
+    status = models.CharField(max_length=50)
+    changed_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["next_attempt_at"], name="entnotif_next_attempt_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["endpoint", "user", "tool"], name="unique_entnotif_endpoint_pair"),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint_id}: {self.user_id}/{self.tool_id} -> {self.status}"
+
+
+class UsageCounter(models.Model):
+    """Events of one user on one tool within one hour, written by payments.metering.
+
+    Kept for billing after the user or tool is gone, so the foreign keys
+    carry no database constraint.
+    """
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    tool = models.ForeignKey(Tool, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    bucket = models.DateTimeField()
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tool", "bucket"], name="unique_usage_user_tool_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}/{self.tool_id} @ {self.bucket}: {self.count}"
+
+
+class StripeProduct(models.Model):
+    """Local copy of a Stripe product, kept current by payments.pricing."""
+    stripe_id = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
+    active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.stripe_id})"
+
+
+class StripePrice(models.Model):
+    """Local copy of a Stripe price; ``Tool.price_id`` refers to ``stripe_id``."""
+    stripe_id = models.CharField(max_length=255, unique=True)
+    # Stripe ID of the product; its row may arrive after the price's.
+    product = models.CharField(max_length=255, blank=True)
+    active = models.BooleanField(default=True)
+    currency = models.CharField(max_length=3)
+    # In the currency's smallest unit; null for tiered and custom prices.
+    unit_amount = models.BigIntegerField(null=True, blank=True)
+    # Empty for one-time prices.
+    interval = models.CharField(max_length=10, blank=True)
+    interval_count = models.PositiveSmallIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.stripe_id
@@ -0,0 +1,157 @@
+"""Entitlement changes pushed to the tool backends.
+
+Every subscription change recorded in the ledger is queued, in the same
+transaction, for each active ``EntitlementEndpoint`` of its tool.
+``deliver_entitlements`` posts what is due as one signed JSON batch per
+endpoint::
+
+    {"events": [{"user_id": 7, "email": "ada@example.com", "tool_id": 3,
+                 "status": "canceled", "has_access": false,
+                 "changed_at": "2026-10-18T18:40:00+00:00"}]}
+
+The body is signed like Stripe's webhooks: the ``X-Crisp-Signature`` header
+is ``t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>" under the endpoint
+secret>``. A pair that changes again before it is sent only goes out with
+its last status. Failed batches are retried with exponential backoff for as
+long as the endpoint stays active, so receivers must accept repeats.
+"""
+import hashlib
+import hmac
+import json
+import time
+from datetime import timedelta
+from itertools import groupby
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EntitlementEndpoint, EntitlementNotification
+
+SIGNATURE_HEADER = "X-Crisp-Signature"
+# Retry delays grow as BACKOFF_BASE * 2 ** attempts, capped at BACKOFF_MAX.
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+# How long a batch being posted is hidden from other workers.
+LEASE = timedelta(minutes=2)
+
+
+def signature(secret, timestamp, body):
+    return hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+
+
+def queue(changes):
+    """Queue ``(user_id, tool_id, old_status, status)`` changes for delivery.
+
+    Called by ``ledger.record`` in the transaction that writes the
+    subscriptions. A pair already waiting for an endpoint is overwritten
+    with the new status but keeps its delivery time, so every change inside
+    ``ENTITLEMENT_NOTIFY_WINDOW`` goes out in one batch.
+    """
+    latest = {(user_id, tool_id): status for user_id, tool_id, _, status in changes}
+    tool_ids = {tool_id for _, tool_id in latest}
+    endpoints = list(
+        EntitlementEndpoint.objects.filter(Q(tool_id__in=tool_ids) | Q(tool__isnull=True), is_active=True)
+        .values_list("id", "tool_id")
+    )
+    if not endpoints:
+        return
+    now = timezone.now()
+    deliver_at = now + timedelta(seconds=settings.ENTITLEMENT_NOTIFY_WINDOW)
+    EntitlementNotification.objects.bulk_create(
+        (
+            EntitlementNotification(
+                endpoint_id=endpoint_id, user_id=user_id, tool_id=tool_id,
+                status=status, changed_at=now, next_attempt_at=deliver_at,
+            )
+            for (user_id, tool_id), status in latest.items()
+            for endpoint_id, endpoint_tool_id in endpoints if endpoint_tool_id in (None, tool_id)
+        ),
+        update_conflicts=True,
+        unique_fields=["endpoint", "user", "tool"],
+        update_fields=["status", "changed_at"],
+        batch_size=1000,
+    )
+
+
+def _payload(notifications):
+    return json.dumps({
+        "events": [
+            {
+                "user_id": notification.user_id,
+                "email": notification.user.email,
+                "tool_id": notification.tool_id,
+                "status": notification.status,
+                "has_access": notification.status == "active",
+                "changed_at": notification.changed_at.isoformat(),
+            }
+            for notification in notifications
+        ]
+    }).encode()
+
+
+def _post(session, endpoint, body):
+    timestamp = int(time.time())
+    response = session.post(
+        endpoint.url,
+        data=body,
+        headers={
+            "Content-Type": "application/json",
+            SIGNATURE_HEADER: f"t={timestamp},v1={signature(endpoint.secret, timestamp, body)}",
+        },
+        timeout=settings.ENTITLEMENT_NOTIFY_TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+def _delivered(batch):
+    """Drop the delivered rows; rows that changed while being posted go out next."""
+    with transaction.atomic():
+        current = dict(
+            EntitlementNotification.objects.select_for_update()
+            .filter(id__in=[notification.id for notification in batch])
+            .values_list("id", "changed_at")
+        )
+        done = [notification.id for notification in batch if current.get(notification.id) == notification.changed_at]
+        EntitlementNotification.objects.filter(id__in=done).delete()
+        EntitlementNotification.objects.filter(id__in=current.keys() - set(done)).update(
+            attempts=0, next_attempt_at=timezone.now(), last_error=""
+        )
+
+
+def deliver_pending(session, batch_size=500):
+    """Post up to ``batch_size`` due notifications, one request per endpoint.
+
+    The rows are leased for ``LEASE`` before posting, so several workers can
+    run side by side without holding locks over HTTP. Returns the number of
+    notifications examined.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            EntitlementNotification.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("endpoint", "user")
+            .filter(next_attempt_at__lte=now, endpoint__is_active=True)
+            .order_by("endpoint_id", "next_attempt_at", "id")[:batch_size]
+        )
+        EntitlementNotification.objects.filter(id__in=[notification.id for notification in notifications]).update(
+            next_attempt_at=now + LEASE
+        )
+
+    for _, batch in groupby(notifications, key=lambda notification: notification.endpoint_id):
+        batch = list(batch)
+        try:
+            _post(session, batch[0].endpoint, _payload(batch))
+        except requests.RequestException as e:
+            for notification in batch:
+                notification.attempts += 1
+                notification.last_error = f"{type(e).__name__}: {e}"
+                notification.next_attempt_at = timezone.now() + min(
+                    BACKOFF_BASE * 2 ** (notification.attempts - 1), BACKOFF_MAX
+                )
+            EntitlementNotification.objects.bulk_update(batch, ["attempts", "last_error", "next_attempt_at"])
+        else:
+            _delivered(batch)
+    return len(notifications)
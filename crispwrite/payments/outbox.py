@@ -0,0 +1,106 @@
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Retry delays grow as BACKOFF_BASE * 2 ** attempts, capped at BACKOFF_MAX.
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+# How long a message being sent is hidden from other workers.
+LEASE = timedelta(minutes=5)
+
+
+def queue_email(subject, body, to, html_body="", from_email=None):
+    """Queue an email for delivery by ``send_outbox``.
+
+    Call this inside the transaction that creates the data the email is
+    about: the message is only sent if that transaction commits.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def queue_emails(messages, from_email=None, batch_size=1000):
+    """Queue many ``(subject, body, to, html_body)`` messages with bulk inserts.
+
+    The same transaction rule as ``queue_email`` applies.
+    """
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    return OutboundEmail.objects.bulk_create(
+        (
+            OutboundEmail(subject=subject, body=body, html_body=html_body, from_email=from_email, to=list(to))
+            for subject, body, to, html_body in messages
+        ),
+        batch_size=batch_size,
+    )
+
+
+def _message(email, connection):
+    msg = EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to, connection=connection)
+    if email.html_body:
+        msg.attach_alternative(email.html_body, "text/html")
+    return msg
+
+
+def _reconnect(connection):
+    try:
+        connection.close()
+        connection.open()
+    except Exception:
+        # The next send tries to open it again and fails into the backoff.
+        logger.warning("Could not reopen the mail connection", exc_info=True)
+
+
+def send_pending(connection, batch_size=50, max_attempts=8):
+    """Deliver up to ``batch_size`` due emails over an already open connection.
+
+    The rows are leased for ``LEASE`` in a short transaction and sent outside
+    it, each one's outcome saved as soon as it is known, so several workers
+    can run side by side without holding locks over SMTP. A failed message
+    is rescheduled with exponential backoff and marked failed after
+    ``max_attempts``. Delivery is at least once: if the process dies before
+    saving an outcome the message is sent again once its lease runs out.
+    Returns the number of emails examined.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(next_attempt_at=now + LEASE)
+
+    for email in emails:
+        email.attempts += 1
+        try:
+            _message(email, connection).send()
+        except Exception as e:
+            if isinstance(e, smtplib.SMTPServerDisconnected):
+                _reconnect(connection)
+            email.last_error = f"{type(e).__name__}: {e}"
+            if email.attempts >= max_attempts:
+                email.status = "failed"
+            else:
+                email.next_attempt_at = timezone.now() + min(
+                    BACKOFF_BASE * 2 ** (email.attempts - 1), BACKOFF_MAX
+                )
+        else:
+            email.status = "sent"
+            email.sent_at = timezone.now()
+            email.last_error = ""
+        email.save(update_fields=["attempts", "status", "next_attempt_at", "last_error", "sent_at"])
+    return len(emails)
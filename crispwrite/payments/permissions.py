@@ -0,0 +1,10 @@
+from rest_framework.permissions import BasePermission
+
+from .authentication import ServiceUser
+
+
+class IsService(BasePermission):
+    """Only allow callers authenticated with a service key."""
+
+    def has_permission(self, request, view):
+        return isinstance(request.user, ServiceUser)
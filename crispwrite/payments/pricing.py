@@ -0,0 +1,120 @@
+"""Local mirror of the Stripe products and prices behind our tools.
+
+``price.*`` and ``product.*`` webhook events keep it current one object at a
+time; ``sync`` re-reads the whole account for the initial load and to repair
+missed events. The tool catalog reads prices from here and never calls
+Stripe.
+"""
+from .models import StripePrice, StripeProduct
+
+BATCH_SIZE = 500
+
+PRODUCT_FIELDS = ["name", "active"]
+PRICE_FIELDS = ["product", "active", "currency", "unit_amount", "interval", "interval_count"]
+
+
+def _product(obj):
+    return StripeProduct(stripe_id=obj["id"], name=obj.get("name") or "", active=bool(obj.get("active")))
+
+
+def _price(obj):
+    product = obj.get("product")
+    recurring = obj.get("recurring") or {}
+    return StripePrice(
+        stripe_id=obj["id"],
+        # Expanded on some API calls.
+        product=(product.get("id") if isinstance(product, dict) else product) or "",
+        active=bool(obj.get("active")),
+        currency=obj.get("currency") or "",
+        unit_amount=obj.get("unit_amount"),
+        interval=recurring.get("interval") or "",
+        interval_count=recurring.get("interval_count"),
+    )
+
+
+def _upsert(model, fields, rows):
+    """Write the rows whose mirrored fields differ from the stored ones.
+
+    Unchanged rows keep their ``updated_at``, so a resync that finds nothing
+    new leaves the catalog version, and the ETag, alone.
+    """
+    stored = {
+        row[0]: row[1:]
+        for row in model.objects.filter(stripe_id__in=[row.stripe_id for row in rows])
+        .values_list("stripe_id", *fields)
+    }
+    changed = [row for row in rows if stored.get(row.stripe_id) != tuple(getattr(row, field) for field in fields)]
+    model.objects.bulk_create(
+        changed,
+        update_conflicts=True,
+        unique_fields=["stripe_id"],
+        update_fields=[*fields, "updated_at"],
+        batch_size=BATCH_SIZE,
+    )
+    return len(changed)
+
+
+def price_changed(event):
+    obj = event["data"]["object"]
+    if event["type"] == "price.deleted":
+        StripePrice.objects.filter(stripe_id=obj["id"]).delete()
+    else:
+        _upsert(StripePrice, PRICE_FIELDS, [_price(obj)])
+
+
+def product_changed(event):
+    obj = event["data"]["object"]
+    if event["type"] == "product.deleted":
+        StripeProduct.objects.filter(stripe_id=obj["id"]).delete()
+    else:
+        _upsert(StripeProduct, PRODUCT_FIELDS, [_product(obj)])
+
+
+def _sync(model, fields, build, objects):
+    seen, batch, changed = set(), [], 0
+    for obj in objects:
+        seen.add(obj["id"])
+        batch.append(build(obj))
+        if len(batch) >= BATCH_SIZE:
+            changed += _upsert(model, fields, batch)
+            batch.clear()
+    changed += _upsert(model, fields, batch)
+    stale = [stripe_id for stripe_id in model.objects.values_list("stripe_id", flat=True) if stripe_id not in seen]
+    for start in range(0, len(stale), BATCH_SIZE):
+        model.objects.filter(stripe_id__in=stale[start:start + BATCH_SIZE]).delete()
+    return changed, len(stale)
+
+
+def sync(products, prices):
+    """Make the mirror match full listings of the account's products and prices.
+
+    Takes iterables of Stripe objects as plain dicts (``to_dict()`` of what
+    ``stripe.Product.list(limit=100).auto_paging_iter()`` yields, say). Rows
+    missing from the listings are deleted. Returns ``{"products": (changed,
+    deleted), "prices": (changed, deleted)}``.
+    """
+    return {
+        "products": _sync(StripeProduct, PRODUCT_FIELDS, _product, products),
+        "prices": _sync(StripePrice, PRICE_FIELDS, _price, prices),
+    }
+
+
+def prices_by_id(price_ids):
+    """``{price_id: price dict}`` for the mirrored ones of ``price_ids``, with product names."""
+    prices = list(StripePrice.objects.filter(stripe_id__in=price_ids))
+    products = dict(
+        StripeProduct.objects.filter(stripe_id__in={price.product for price in prices})
+        .values_list("stripe_id", "name")
+    )
+    return {
+        price.stripe_id: {
+            "id": price.stripe_id,
+            "product_name": products.get(price.product, ""),
+            "active": price.active,
+            "currency": price.currency,
+            "unit_amount": price.unit_amount,
+            "interval": price.interval or None,
+            "interval_count": price.interval_count,
+        }
+        for price in prices
+    }
@@ -0,0 +1,276 @@
+import json
+from collections import Counter, namedtuple
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import User, Tool, Subscription
+from .utils import stripe_period_end, stripe_timestamp
+from . import entitlements, ledger
+
+# Stripe subscription statuses mapped onto the ones this app stores. A trial
+# grants access just like a paid period, matching checkout.session.completed.
+STRIPE_STATUSES = {
+    "active": "active",
+    "trialing": "active",
+    "canceled": "canceled",
+    "unpaid": "canceled",
+    "incomplete_expired": "canceled",
+}
+
+SUBSCRIPTION_EVENTS = {
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+}
+
+
+def _email(obj):
+    customer = obj.get("customer")
+    if isinstance(customer, dict) and customer.get("email"):
+        return customer["email"]
+    details = obj.get("customer_details") or {}
+    return obj.get("customer_email") or details.get("email")
+
+
+def _customer_id(obj):
+    customer = obj.get("customer")
+    return customer.get("id") if isinstance(customer, dict) else customer
+
+
+def _price_ids(obj):
+    items = (obj.get("items") or {}).get("data") or []
+    return [item["price"]["id"] for item in items if item.get("price")]
+
+
+# One export line's subscription state. The dates are None when the line
+# doesn't carry them, as for checkout sessions, and so are the Stripe IDs.
+# ``order`` is the event's ``(created, id)``, or ``(0, "")`` for a bare object.
+Record = namedtuple(
+    "Record",
+    "email tool_key status trial_ends_at current_period_end subscription_id customer_id order",
+)
+
+
+def parse_record(line):
+    """Turn one export line into a ``Record``.
+
+    Lines may be raw subscription or checkout session objects, or events
+    wrapping them. ``tool_key`` is either ``("id", tool_id)`` from the
+    checkout metadata or ``("price", price_id)`` from the subscription items.
+    Returns None for lines that carry no subscription state. ``status`` is
+    None for a Stripe status missing from ``STRIPE_STATUSES``.
+    """
+    obj = json.loads(line)
+    order = (0, "")
+    if obj.get("object") == "event":
+        order = (int(obj["created"]), obj["id"])
+        event_type = obj.get("type")
+        if event_type != "checkout.session.completed" and event_type not in SUBSCRIPTION_EVENTS:
+            return None
+        obj = obj["data"]["object"]
+        if event_type == "customer.subscription.deleted":
+            obj = dict(obj, status="canceled")
+
+    if obj.get("object") == "checkout.session":
+        if obj.get("status", "complete") != "complete":
+            return None
+        status = "active"
+        trial_ends_at = period_end = None
+        subscription_id = obj.get("subscription")
+    elif obj.get("object") == "subscription":
+        status = STRIPE_STATUSES.get(obj.get("status"))
+        trial_ends_at, period_end = stripe_timestamp(obj.get("trial_end")), stripe_period_end(obj)
+        subscription_id = obj.get("id")
+    else:
+        return None
+
+    metadata = obj.get("metadata") or {}
+    if metadata.get("tool_id"):
+        tool_key = ("id", str(metadata["tool_id"]))
+    elif _price_ids(obj):
+        tool_key = ("price", _price_ids(obj)[0])
+    else:
+        tool_key = None
+    return Record(
+        _email(obj), tool_key, status, trial_ends_at, period_end, subscription_id, _customer_id(obj), order
+    )
+
+
+class Reconciler:
+    """Diff a streamed Stripe export against ``Subscription`` and repair it.
+
+    Records are consumed ``chunk_size`` at a time. Each chunk costs a user
+    lookup, two subscription lookups and at most one bulk insert and two bulk
+    updates. Events are applied in ``(created, id)`` order and bare objects
+    before them, in file order, so the newest line for a user and tool wins
+    wherever it sits in the export. That order is kept across chunks by
+    remembering the newest event applied per pair, so memory grows with the
+    number of distinct (email, tool) pairs that have events in the export;
+    an export of bare subscription objects keeps it empty. The Stripe
+    subscription and customer IDs are copied onto the rows, unless another
+    row already has them, so later webhooks find them. A dry run diffs every
+    chunk against the unmodified database, so a pair repeated across chunks
+    is counted once per chunk.
+    """
+
+    def __init__(self, chunk_size=2000, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.stats = Counter()
+        self.applied = {}  # (email, tool_id) -> order of the newest event
+        tools = list(Tool.objects.only("id", "price_id"))
+        self.tools_by_id = {str(tool.id): tool.id for tool in tools}
+        self.tools_by_price = {tool.price_id: tool.id for tool in tools}
+
+    def run(self, lines):
+        lines = iter(lines)
+        while True:
+            chunk = list(islice(lines, self.chunk_size))
+            if not chunk:
+                return self.stats
+            self.apply_chunk(chunk)
+
+    def _tool_id(self, tool_key):
+        if tool_key is None:
+            return None
+        kind, value = tool_key
+        lookup = self.tools_by_id if kind == "id" else self.tools_by_price
+        return lookup.get(value)
+
+    def apply_chunk(self, lines):
+        wanted = {}
+        for line in lines:
+            if not line.strip():
+                continue
+            self.stats["read"] += 1
+            try:
+                record = parse_record(line)
+            except (ValueError, KeyError, TypeError):
+                self.stats["skipped_malformed"] += 1
+                continue
+            if record is None:
+                self.stats["skipped_irrelevant"] += 1
+                continue
+            tool_id = self._tool_id(record.tool_key)
+            if record.status is None:
+                self.stats["skipped_unknown_status"] += 1
+            elif not record.email:
+                self.stats["skipped_no_email"] += 1
+            elif tool_id is None:
+                self.stats["skipped_unknown_tool"] += 1
+            elif record.order < self.applied.get((record.email, tool_id), record.order):
+                self.stats["skipped_superseded"] += 1
+            else:
+                if record.order > (0, ""):
+                    self.applied[(record.email, tool_id)] = record.order
+                wanted[(record.email, tool_id)] = record
+
+        # Registration stores the email as the username, which unlike the
+        # email column is indexed.
+        users, customers = {}, {}
+        for username, user_id, customer_id in User.objects.filter(
+            username__in={email for email, _ in wanted}
+        ).values_list("username", "id", "stripe_customer_id"):
+            users[username] = user_id
+            customers[user_id] = customer_id
+        targets = {}
+        for (email, tool_id), record in wanted.items():
+            if email not in users:
+                self.stats["skipped_unknown_user"] += 1
+                continue
+            targets[(users[email], tool_id)] = record
+
+        # Stripe IDs are unique; leave alone any that another row holds.
+        subscription_owners = dict(
+            Subscription.objects.filter(
+                stripe_subscription_id__in={r.subscription_id for r in targets.values() if r.subscription_id}
+            ).values_list("stripe_subscription_id", "id")
+        )
+        customer_owners = dict(
+            User.objects.filter(
+                stripe_customer_id__in={r.customer_id for r in targets.values() if r.customer_id}
+            ).values_list("stripe_customer_id", "id")
+        )
+        to_link = {}
+        for (user_id, _), record in targets.items():
+            if record.customer_id and not customers[user_id] and record.customer_id not in customer_owners:
+                customer_owners[record.customer_id] = user_id
+                to_link[user_id] = record.customer_id
+
+        existing = {}
+        for sub in (
+            Subscription.objects.filter(
+                user_id__in={user_id for user_id, _ in targets},
+                tool_id__in={tool_id for _, tool_id in targets},
+            )
+            .only(
+                "id", "user_id", "tool_id", "status", "email",
+                "trial_ends_at", "current_period_end", "stripe_subscription_id",
+            )
+            .order_by("id")
+        ):
+            existing[(sub.user_id, sub.tool_id)] = sub
+
+        now = timezone.now()
+        to_create, to_update, transitions, revoked, changed = [], [], [], set(), set()
+        for (user_id, tool_id), record in targets.items():
+            status = record.status
+            sub = existing.get((user_id, tool_id))
+            # Rows created in this chunk own their IDs by pair.
+            sub_pk = sub.id if sub else (user_id, tool_id)
+            subscription_id = record.subscription_id
+            if subscription_owners.get(subscription_id, sub_pk) != sub_pk:
+                subscription_id = None
+            elif subscription_id:
+                subscription_owners[subscription_id] = sub_pk
+            if sub is None:
+                to_create.append(Subscription(
+                    user_id=user_id, tool_id=tool_id, status=status, email=record.email,
+                    trial_ends_at=record.trial_ends_at, current_period_end=record.current_period_end,
+                    stripe_subscription_id=subscription_id,
+                ))
+                transitions.append((user_id, tool_id, "", status))
+                changed.add(user_id)
+                continue
+            relinked = bool(subscription_id) and sub.stripe_subscription_id != subscription_id
+            if sub.status == status and not relinked:
+                self.stats["unchanged"] += 1
+                continue
+            if relinked:
+                sub.stripe_subscription_id = subscription_id
+            if sub.status != status:
+                if sub.status == "active":
+                    revoked.add(user_id)
+                transitions.append((user_id, tool_id, sub.status, status))
+                sub.status = status
+                if status == "active":
+                    # A stale period end would have the sweeper expire it again.
+                    sub.trial_ends_at = record.trial_ends_at
+                    sub.current_period_end = record.current_period_end
+                changed.add(user_id)
+            sub.updated_at = now
+            to_update.append(sub)
+
+        self.stats["created"] += len(to_create)
+        self.stats["updated"] += len(to_update)
+        self.stats["customers_linked"] += len(to_link)
+        if self.dry_run or not (to_create or to_update or to_link):
+            return
+
+        with transaction.atomic():
+            Subscription.objects.bulk_create(to_create)
+            Subscription.objects.bulk_update(
+                to_update, ["status", "trial_ends_at", "current_period_end", "stripe_subscription_id", "updated_at"]
+            )
+            User.objects.bulk_update(
+                [User(id=user_id, stripe_customer_id=customer_id) for user_id, customer_id in to_link.items()],
+                ["stripe_customer_id"],
+            )
+            if transitions:
+                ledger.record(transitions, source="reconcile")
+            if revoked:
+                entitlements.revoke(*revoked)
+            if changed:
+                transaction.on_commit(lambda: entitlements.invalidate(*changed))
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import current_version
+from .models import Tool
+
+# An immutable copy of a Tool row, safe to share between threads.
+ToolSnapshot = namedtuple("ToolSnapshot", "id name description price_id is_active")
+
+_lock = threading.Lock()
+_local = {"version": None, "by_id": {}, "by_name": {}, "checked_at": float("-inf")}
+
+
+def _normalize(name):
+    return name.strip().casefold()
+
+
+def _load():
+    version, _ = current_version()
+    if version == _local["version"]:
+        return
+    by_id, by_name = {}, {}
+    for tool in Tool.objects.order_by("id").values_list(*ToolSnapshot._fields):
+        snapshot = ToolSnapshot(*tool)
+        by_id[snapshot.id] = snapshot
+        by_name.setdefault(_normalize(snapshot.name), snapshot)
+    _local.update(version=version, by_id=by_id, by_name=by_name)
+
+
+def _stale():
+    return time.monotonic() - _local["checked_at"] >= settings.CATALOG_VERSION_CHECK_INTERVAL
+
+
+def _ensure_fresh():
+    if not _stale():
+        return
+    with _lock:
+        if _stale():
+            _load()
+            _local["checked_at"] = time.monotonic()
+
+
+def get_tool(id_or_name):
+    """Return the snapshot of a tool by numeric id or case-insensitive name.
+
+    Tools are loaded once per process and served from memory. Saves and
+    deletes in this process reload them immediately; changes made by other
+    processes are noticed within ``CATALOG_VERSION_CHECK_INTERVAL`` seconds.
+    Returns None for an unknown tool.
+    """
+    _ensure_fresh()
+    key = str(id_or_name)
+    # isdigit() also takes '²', which int() rejects.
+    if key.isascii() and key.isdecimal():
+        return _local["by_id"].get(int(key))
+    return _local["by_name"].get(_normalize(key))
+
+
+def invalidate():
+    """Make the next lookup re-check the tool version."""
+    _local["checked_at"] = float("-inf")
+
+
+@receiver(post_save, sender=Tool)
+@receiver(post_delete, sender=Tool)
+def _tool_changed(sender, **kwargs):
+    transaction.on_commit(invalidate)
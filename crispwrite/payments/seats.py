@@ -0,0 +1,140 @@
+import csv
+import io
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import User, Subscription
+from .tokens import invitation_token_generator
+from . import emails, entitlements, ledger, outbox
+
+MEMBER_FIELDS = ["email", "first_name", "last_name", "phone"]
+
+
+def parse_csv(text):
+    """Read members from CSV text with a header row naming ``MEMBER_FIELDS`` columns."""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "email" not in reader.fieldnames:
+        raise ValueError("CSV needs a header row with an email column")
+    return list(reader)
+
+
+def clean_members(rows):
+    """Validate member rows and return ``(members, errors)``.
+
+    Members are dicts with the ``MEMBER_FIELDS`` keys; a repeated email
+    keeps its first row. Errors are ``{"row", "email", "error"}`` dicts,
+    numbered from 1.
+    """
+    members, errors, seen = [], [], set()
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": number, "email": None, "error": "Expected an object"})
+            continue
+        email = str(row.get("email") or "").strip()
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append({"row": number, "email": email, "error": "Invalid email"})
+            continue
+        if email in seen:
+            continue
+        seen.add(email)
+        member = {field: str(row.get(field) or "").strip() for field in MEMBER_FIELDS}
+        member["email"] = email
+        members.append(member)
+    return members, errors
+
+
+def invite_url(user):
+    """Link to the page where an invited user chooses a password."""
+    return settings.INVITE_ACCEPT_URL.format(
+        uidb64=urlsafe_base64_encode(force_bytes(user.pk)),
+        token=invitation_token_generator.make_token(user),
+    )
+
+
+def provision(members, tool, chunk_size=500):
+    """Give each member an active subscription to ``tool``, creating accounts as needed.
+
+    Members without an account get an inactive user with an unusable
+    password and a queued invitation email; nothing is hashed here, the
+    invitee's password is hashed once when they accept. Existing users keep
+    their account and only gain the subscription. Each chunk is one
+    transaction of bulk inserts plus its ledger events. Yields
+    ``(created, subscribed)`` counts per chunk.
+    """
+    for start in range(0, len(members), chunk_size):
+        chunk = members[start:start + chunk_size]
+        usernames = [member["email"] for member in chunk]
+        with transaction.atomic():
+            existing = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+            new_users = [
+                User(
+                    username=member["email"],
+                    email=member["email"],
+                    first_name=member["first_name"],
+                    last_name=member["last_name"],
+                    phone=member["phone"] or None,
+                    password=make_password(None),
+                    is_active=False,
+                )
+                for member in chunk if member["email"] not in existing
+            ]
+            # A concurrent registration of the same email wins. Its user
+            # still gets the seat; the invitation sent to it can't be used,
+            # as the token is bound to a password that user doesn't have.
+            User.objects.bulk_create(new_users, ignore_conflicts=True)
+            user_ids = dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+            for user in new_users:
+                user.pk = user_ids[user.username]
+
+            statuses = dict(
+                Subscription.objects.select_for_update()
+                .filter(tool_id=tool.id, user_id__in=user_ids.values())
+                .values_list("user_id", "status")
+            )
+            # Seats are billed to the team, not through a Stripe period, so
+            # they carry no period end for sweep_subscriptions to act on.
+            Subscription.objects.bulk_create(
+                Subscription(
+                    user_id=user_id, tool_id=tool.id, status="active", email=username,
+                    trial_ends_at=None, current_period_end=None,
+                )
+                for username, user_id in user_ids.items() if user_id not in statuses
+            )
+            reactivated = [user_id for user_id, status in statuses.items() if status != "active"]
+            if reactivated:
+                Subscription.objects.filter(tool_id=tool.id, user_id__in=reactivated).update(
+                    status="active", trial_ends_at=None, current_period_end=None, updated_at=timezone.now()
+                )
+            changes = [
+                (user_id, tool.id, statuses.get(user_id, ""), "active")
+                for user_id in user_ids.values() if statuses.get(user_id) != "active"
+            ]
+            if changes:
+                ledger.record(changes, source="seats")
+
+            messages = []
+            for user in new_users:
+                subject, text_body, html_body = emails.INVITATION.render(
+                    first_name=user.first_name, tool_name=tool.name, invite_url=invite_url(user),
+                )
+                messages.append((subject, text_body, [user.email], html_body))
+            outbox.queue_emails(messages)
+            transaction.on_commit(partial(entitlements.invalidate, *[change[0] for change in changes]))
+        yield len(new_users), len(changes)
+
+
+def accept_invitation(user, password):
+    """Set the invitee's first password and activate the account."""
+    user.set_password(password)
+    user.is_active = True
+    user.save(update_fields=["password", "is_active"])
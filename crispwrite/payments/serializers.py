@@ -35,3 +35,9 @@ class ToolSerializer(serializers.Serializer):
     name = serializers.CharField()
     description = serializers.CharField()
     is_active = serializers.BooleanField()
+    # From the local Stripe mirror passed in as the "prices" context; null
+    # until the tool's price has been synced.
+    price = serializers.SerializerMethodField()
+
+    def get_price(self, tool):
+        return self.context.get("prices", {}).get(tool.price_id)
@@ -0,0 +1,702 @@
+import json
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+
+from django.contrib.admin.sites import site as admin_site
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from api import idempotency, ratelimit
+
+from .admin import SubscriptionAdmin
+from .models import (
+    EntitlementEndpoint, EntitlementNotification, OutboundEmail, StripePrice, Subscription, Tool,
+    UsageCounter, User, WebhookEvent,
+)
+from .reconcile import Reconciler
+from .tokens import EntitlementRefreshToken, invitation_token_generator
+from . import (
+    accounts, async_views, catalog, checkout, entitlements, ledger, lifecycle, metering, notifications, outbox,
+    pricing, registry, webhooks,
+)
+
+
+class DisconnectedBackend(BaseEmailBackend):
+    def open(self):
+        raise OSError("connection refused")
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected("gone")
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    RATE_LIMIT_ENABLED=False,
+)
+class OutboxTests(TestCase):
+    def register(self, email="ada@example.com"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/register/", {
+                "first_name": "Ada",
+                "last_name": "Lovelace",
+                "email": email,
+                "phone": "0700000000",
+                "password": "correct horse",
+                "repeat_password": "correct horse",
+            })
+
+    def test_registration_email_is_queued_and_sent(self):
+        self.assertEqual(self.register().status_code, 200)
+
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, "pending")
+        self.assertEqual(queued.to, ["ada@example.com"])
+        self.assertEqual(mail.outbox, [])
+
+        call_command("send_outbox", stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["ada@example.com"])
+        self.assertEqual(mail.outbox[0].subject, queued.subject)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, "sent")
+        self.assertEqual(queued.attempts, 1)
+        self.assertIsNotNone(queued.sent_at)
+
+    def test_registration_that_loses_the_race_queues_nothing(self):
+        User.objects.create(username="ada@example.com", email="ada@example.com")
+        data = {
+            "first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com",
+            "phone": "0700000000", "password": "correct horse", "repeat_password": "correct horse",
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError):
+                accounts.create_inactive_user(data, make_password("correct horse"), RequestFactory().post("/"))
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_sent_email_is_not_sent_again(self):
+        self.register()
+        call_command("send_outbox", stdout=StringIO())
+        call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_is_rescheduled_when_reconnect_fails(self):
+        self.register()
+        with self.assertLogs("payments.outbox", "WARNING"):
+            self.assertEqual(outbox.send_pending(DisconnectedBackend()), 1)
+
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, "pending")
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn("SMTPServerDisconnected", queued.last_error)
+        self.assertGreater(queued.next_attempt_at, queued.created_at)
+
+
+class RevokeTests(TestCase):
+    def test_revoke_waits_for_commit(self):
+        user = User.objects.create(username="ada@example.com", email="ada@example.com")
+        cache.set(entitlements._key(user.id), frozenset({1}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entitlements.revoke(user.id)
+            user.refresh_from_db()
+            self.assertEqual(user.entitlements_version, 0)
+            self.assertIsNotNone(cache.get(entitlements._key(user.id)))
+
+        user.refresh_from_db()
+        self.assertEqual(user.entitlements_version, 1)
+        self.assertIsNone(cache.get(entitlements._key(user.id)))
+
+
+class ReconcileTests(TestCase):
+    fixture_path = Path(__file__).parent / "testdata" / "stripe_export_sample.jsonl"
+
+    def setUp(self):
+        Tool.objects.create(id=1, name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+        Tool.objects.create(id=2, name="Resume Analyzer", description="", price_id="price_resume_analyzer_monthly")
+        for email in ["ada@example.com", "grace@example.com", "linus@example.com"]:
+            User.objects.create(username=email, email=email)
+
+    def test_dry_run_of_sample_export(self):
+        out = StringIO()
+        call_command("reconcile_subscriptions", str(self.fixture_path), "--dry-run", stdout=out)
+
+        self.assertIn("Would apply: 3 created, 0 updated, 0 unchanged (7 records read)", out.getvalue())
+        self.assertIn("skipped unknown user: 1", out.getvalue())
+        self.assertIn("skipped unknown tool: 1", out.getvalue())
+        self.assertIn("skipped irrelevant: 1", out.getvalue())
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_newest_event_wins_regardless_of_file_order(self):
+        lines = self.fixture_path.read_text().splitlines()
+        Reconciler(chunk_size=1).run(reversed(lines))
+
+        statuses = dict(Subscription.objects.values_list("user__username", "status"))
+        self.assertEqual(statuses["linus@example.com"], "canceled")
+        self.assertEqual(statuses["ada@example.com"], "active")
+        self.assertEqual(statuses["grace@example.com"], "active")
+
+    def test_stripe_ids_are_copied_for_later_webhooks(self):
+        Reconciler().run(self.fixture_path.read_text().splitlines())
+
+        ada = User.objects.get(username="ada@example.com")
+        self.assertEqual(ada.stripe_customer_id, "cus_1")
+        self.assertEqual(Subscription.objects.get(user=ada).stripe_subscription_id, "sub_1")
+        self.assertEqual(
+            Subscription.objects.get(user__username="linus@example.com").stripe_subscription_id, "sub_3"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            webhooks.customer_subscription_changed({
+                "type": "customer.subscription.deleted",
+                "data": {"object": {"id": "sub_1", "status": "active"}},
+            })
+        self.assertEqual(Subscription.objects.get(user=ada).status, "canceled")
+
+    def test_unknown_status_is_skipped(self):
+        line = json.dumps({
+            "object": "subscription", "status": "paused", "customer_email": "ada@example.com",
+            "metadata": {"tool_id": "1"},
+        })
+        stats = Reconciler().run([line])
+
+        self.assertEqual(stats["skipped_unknown_status"], 1)
+        self.assertFalse(Subscription.objects.exists())
+
+
+@override_settings(SERVICE_API_KEYS={"tools": "secret"})
+class BatchEntitlementsTests(TestCase):
+    def post(self, payload):
+        return self.client.post(
+            "/api/entitlements/batch/", payload, content_type="application/json",
+            headers={"Authorization": "Service secret"},
+        )
+
+    def test_rejects_identifiers_of_the_wrong_type(self):
+        for payload in [
+            {"user_ids": ["1"]},
+            {"user_ids": [1, True]},
+            {"user_ids": [1.5]},
+            {"emails": ["ada@example.com", 7]},
+            {"emails": [["ada@example.com"]]},
+        ]:
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+
+    def test_accepts_integer_user_ids(self):
+        user = User.objects.create(username="ada@example.com", email="ada@example.com")
+        response = self.post({"user_ids": [user.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["user_id"], user.id)
+
+
+# With caching on, as it is against a shared cache, to exercise the cached path.
+@override_settings(ENTITLEMENT_CACHE_TIMEOUT=300)
+class CheckSubscriptionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tool = Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+        self.user = User.objects.create(username="ada@example.com", email="ada@example.com", is_active=True)
+        Subscription.objects.create(user=self.user, tool=self.tool, status="active")
+
+    def get(self, token):
+        return self.client.get("/api/auth/check-subscription/", headers={"Authorization": f"Bearer {token}"})
+
+    def test_active_user_has_access(self):
+        token = EntitlementRefreshToken.for_user(self.user).access_token
+        response = self.get(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"has_access": True, "tools": [self.tool.id]})
+
+    def test_deactivated_user_is_rejected(self):
+        token = EntitlementRefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.get(token).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            entitlements.revoke(self.user.id)
+
+        self.assertEqual(self.get(token).status_code, 401)
+
+    def test_stale_entitlement_version_is_rejected(self):
+        token = EntitlementRefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.get(token).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entitlements.revoke(self.user.id)
+
+        self.assertEqual(self.get(token).status_code, 401)
+        fresh = EntitlementRefreshToken.for_user(User.objects.get(pk=self.user.pk)).access_token
+        self.assertEqual(self.get(fresh).status_code, 200)
+
+
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={"login": {"ip": "2/m"}})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        return self.client.post(
+            "/api/login/", {"email": "ada@example.com", "password": "wrong"}, content_type="application/json"
+        )
+
+    def test_limit_is_enforced(self):
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 401)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+    def test_concurrent_requests_cannot_exceed_the_limit(self):
+        results = []
+
+        def request():
+            results.append(ratelimit.hit("rl:test", 10, 60, now=30.0))
+
+        threads = [threading.Thread(target=request) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(0), 10)
+
+    def test_middleware_is_async_capable(self):
+        self.assertTrue(ratelimit.RateLimitMiddleware.async_capable)
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog._local.update(catalog=None, checked_at=0.0, checking=False)
+        self.addCleanup(catalog._local.update, catalog=None, checked_at=0.0, checking=False)
+        Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+
+    def test_database_outage_serves_last_good_catalog_without_rechecking(self):
+        good = catalog.get_catalog()
+        catalog._local["checked_at"] = 0.0
+
+        with mock.patch.object(catalog, "current_version", side_effect=DatabaseError) as version:
+            self.assertEqual(catalog.get_catalog(), good)
+            self.assertEqual(catalog.get_catalog(), good)
+        self.assertEqual(version.call_count, 1)
+
+    def test_outage_without_a_catalog_raises(self):
+        with mock.patch.object(catalog, "current_version", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                catalog.get_catalog()
+
+
+class CheckoutSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def session(self, url):
+        return SimpleNamespace(url=url, expires_at=time.time() + 3600)
+
+    def test_concurrent_requests_create_one_session(self):
+        calls, results = [], []
+        started = threading.Event()
+
+        def create():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return self.session("https://checkout.stripe.test/1")
+
+        def request():
+            results.append(checkout.get_or_create_session_url(1, 1, create))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["https://checkout.stripe.test/1"] * 5)
+
+    def test_waiter_takes_over_when_the_holder_fails(self):
+        def fail():
+            raise RuntimeError("stripe is down")
+
+        with self.assertRaises(RuntimeError):
+            checkout.get_or_create_session_url(1, 1, fail)
+        url = checkout.get_or_create_session_url(1, 1, lambda: self.session("https://checkout.stripe.test/2"))
+        self.assertEqual(url, "https://checkout.stripe.test/2")
+
+    def test_waiter_does_not_create_or_release_a_lock_it_does_not_own(self):
+        lock_key = checkout.LOCK_KEY.format(user_id=1, tool_id=1)
+        cache.add(lock_key, "holder", 60)
+        create = mock.Mock()
+
+        with mock.patch.object(checkout, "LOCK_TIMEOUT", 0.1):
+            with self.assertRaises(checkout.CheckoutInProgress):
+                checkout.get_or_create_session_url(1, 1, create)
+        create.assert_not_called()
+        self.assertEqual(cache.get(lock_key), "holder")
+
+
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        webhooks.record_event({
+            "id": "evt_1", "type": "checkout.session.completed", "created": 1752000000,
+            "data": {"object": {"id": "cs_1", "customer_email": "nobody@example.com", "metadata": {"tool_id": "1"}}},
+        })
+
+    def test_failed_event_backs_off_and_then_dies(self):
+        self.assertEqual(webhooks.process_pending(max_attempts=2), 1)
+        event = WebhookEvent.objects.get()
+        self.assertIsNone(event.dead_at)
+        self.assertGreater(event.next_attempt_at, event.received_at)
+        self.assertEqual(webhooks.process_pending(max_attempts=2), 0)
+
+        WebhookEvent.objects.update(next_attempt_at=event.received_at)
+        with self.assertLogs("payments.webhooks", "ERROR"):
+            self.assertEqual(webhooks.process_pending(max_attempts=2), 1)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNotNone(event.dead_at)
+        self.assertIsNone(event.processed_at)
+        self.assertIn("DoesNotExist", event.last_error)
+
+        WebhookEvent.objects.update(next_attempt_at=event.received_at)
+        self.assertEqual(webhooks.process_pending(max_attempts=2), 0)
+
+
+class MySubscriptionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog._local.update(catalog=None, checked_at=0.0, checking=False)
+        self.addCleanup(catalog._local.update, catalog=None, checked_at=0.0, checking=False)
+        self.tool = Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+        self.user = User.objects.create(username="ada@example.com", email="ada@example.com", is_active=True)
+        Subscription.objects.create(user=self.user, tool=self.tool, status="active")
+        self.client.force_login(self.user)
+
+    def test_renamed_tool_changes_the_etag(self):
+        first = self.client.get("/api/my-subscriptions/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(
+            self.client.get("/api/my-subscriptions/", headers={"If-None-Match": first["ETag"]}).status_code, 304
+        )
+
+        self.tool.name = "CrispWrite Pro"
+        self.tool.save()
+        catalog._local["checked_at"] = 0.0
+        second = self.client.get("/api/my-subscriptions/", headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()[0]["tool"], "CrispWrite Pro")
+
+    def test_link_header_is_exposed_to_cross_origin_clients(self):
+        response = self.client.get("/api/my-subscriptions/", headers={"Origin": "http://localhost:5000"})
+        self.assertIn("Link", response["Access-Control-Expose-Headers"])
+
+
+@override_settings(PASSWORD_HASHERS=[
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+])
+class AsyncLoginTests(TestCase):
+    async def test_outdated_hash_is_upgraded_on_login(self):
+        await User.objects.acreate(
+            username="ada@example.com", email="ada@example.com", is_active=True,
+            password=make_password("correct horse", hasher="md5"),
+        )
+        request = AsyncRequestFactory().post(
+            "/api/login/", {"email": "ada@example.com", "password": "correct horse"},
+            content_type="application/json",
+        )
+
+        response = await async_views.login(request)
+
+        self.assertEqual(response.status_code, 200)
+        user = await User.objects.aget(username="ada@example.com")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+        self.assertTrue(user.check_password("correct horse"))
+
+
+@override_settings(RATE_LIMIT_ENABLED=False, IDEMPOTENCY_WAIT=0)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def register(self, email, key="key-1", address="127.0.0.1"):
+        return self.client.post(
+            "/api/register/",
+            {
+                "first_name": "Ada", "last_name": "Lovelace", "email": email, "phone": "0700000000",
+                "password": "correct horse", "repeat_password": "correct horse",
+            },
+            content_type="application/json",
+            headers={"Idempotency-Key": key},
+            REMOTE_ADDR=address,
+        )
+
+    def test_retry_is_replayed(self):
+        first = self.register("ada@example.com")
+        retry = self.register("ada@example.com")
+
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.register("ada@example.com")
+        self.assertEqual(self.register("grace@example.com").status_code, 422)
+
+    def test_anonymous_clients_do_not_share_keys(self):
+        self.register("ada@example.com", address="203.0.113.1")
+        other = self.register("grace@example.com", address="203.0.113.2")
+
+        self.assertEqual(other.status_code, 200)
+        self.assertFalse(other.has_header("Idempotent-Replayed"))
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_duplicate_of_a_running_request_is_a_conflict(self):
+        view = idempotency.idempotent(lambda request: HttpResponse("ran"))
+        request = RequestFactory().post("/retry/", headers={"Idempotency-Key": "key-1"})
+        request.user = AnonymousUser()
+        cache.add(f"{idempotency._cache_key(request, 'key-1', request.user)}:lock", True)
+
+        response = view(request)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class RegistryTests(TestCase):
+    def setUp(self):
+        registry.invalidate()
+        self.addCleanup(registry.invalidate)
+        self.tool = Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+
+    def test_lookup_by_id_and_name(self):
+        self.assertEqual(registry.get_tool(self.tool.id).id, self.tool.id)
+        self.assertEqual(registry.get_tool(str(self.tool.id)).id, self.tool.id)
+        self.assertEqual(registry.get_tool("  crispwrite ").id, self.tool.id)
+
+    def test_non_ascii_digits_are_names(self):
+        self.assertIsNone(registry.get_tool("²"))
+        self.assertIsNone(registry.get_tool("١"))
+
+
+class SweepTests(TestCase):
+    def test_reactivated_subscription_is_not_expired_again(self):
+        tool = Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+        user = User.objects.create(username="ada@example.com", email="ada@example.com", is_active=True)
+        lapsed = timezone.now() - timedelta(days=30)
+        subscription = Subscription.objects.create(
+            user=user, tool=tool, status="expired", trial_ends_at=lapsed, current_period_end=lapsed
+        )
+
+        SubscriptionAdmin(Subscription, admin_site).activate_subscriptions(
+            mock.Mock(), Subscription.objects.filter(pk=subscription.pk)
+        )
+        self.assertEqual(list(lifecycle.sweep_expired()), [])
+
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.status, "active")
+        self.assertIsNone(subscription.current_period_end)
+
+
+@override_settings(
+    SERVICE_API_KEYS={"tools": "secret"},
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    RATE_LIMIT_ENABLED=False,
+)
+class SeatProvisioningTests(TestCase):
+    def setUp(self):
+        registry.invalidate()
+        self.addCleanup(registry.invalidate)
+        self.tool = Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+        self.existing = User.objects.create(
+            username="grace@example.com", email="grace@example.com", is_active=True,
+            password=make_password("grace's password"),
+        )
+
+    def provision(self, members):
+        return self.client.post(
+            "/api/seats/provision/", {"tool_id": self.tool.id, "members": members},
+            content_type="application/json", headers={"Authorization": "Service secret"},
+        )
+
+    def accept(self, user, token, password="correct horse"):
+        uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+        return self.client.post(
+            f"/api/invite/accept/{uidb64}/{token}/",
+            {"password": password, "repeat_password": password}, content_type="application/json",
+        )
+
+    def test_members_are_subscribed_and_new_ones_invited(self):
+        response = self.provision([
+            {"email": "ada@example.com", "first_name": "Ada"},
+            {"email": "grace@example.com"},
+        ])
+
+        self.assertEqual(response.json(), {"members": 2, "invited": 1, "subscribed": 2})
+        self.assertEqual(Subscription.objects.filter(tool=self.tool, status="active").count(), 2)
+        invited = User.objects.get(username="ada@example.com")
+        self.assertFalse(invited.is_active)
+        self.assertFalse(invited.has_usable_password())
+        self.assertEqual(OutboundEmail.objects.get().to, ["ada@example.com"])
+
+    def test_invalid_rows_provision_nothing(self):
+        response = self.provision([{"email": "ada@example.com"}, {"email": "not an email"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["row"], 2)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_invitation_can_be_accepted_once(self):
+        self.provision([{"email": "ada@example.com"}])
+        invited = User.objects.get(username="ada@example.com")
+        token = invitation_token_generator.make_token(invited)
+
+        response = self.accept(invited, token)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.json())
+        invited.refresh_from_db()
+        self.assertTrue(invited.is_active)
+
+        self.assertEqual(self.accept(invited, token, password="takeover").status_code, 400)
+        invited.refresh_from_db()
+        self.assertTrue(invited.check_password("correct horse"))
+
+    def test_other_tokens_do_not_pass_as_invitations(self):
+        self.provision([{"email": "ada@example.com"}])
+        invited = User.objects.get(username="ada@example.com")
+        self.assertEqual(self.accept(invited, default_token_generator.make_token(invited)).status_code, 400)
+
+    def test_existing_account_cannot_be_claimed(self):
+        token = invitation_token_generator.make_token(self.existing)
+        self.assertEqual(self.accept(self.existing, token).status_code, 400)
+        self.existing.refresh_from_db()
+        self.assertTrue(self.existing.check_password("grace's password"))
+
+
+@override_settings(ENTITLEMENT_NOTIFY_WINDOW=0)
+class EntitlementNotificationTests(TestCase):
+    def setUp(self):
+        self.tool = Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+        self.user = User.objects.create(username="ada@example.com", email="ada@example.com")
+        self.endpoint = EntitlementEndpoint.objects.create(name="crispwrite", tool=self.tool, url="http://tool.test/")
+        self.session = mock.Mock()
+
+    def test_change_is_delivered_signed_and_dropped(self):
+        ledger.record([(self.user.id, self.tool.id, "", "active")], source="test")
+        self.assertEqual(notifications.deliver_pending(self.session), 1)
+
+        (url,), kwargs = self.session.post.call_args
+        self.assertEqual(url, "http://tool.test/")
+        timestamp, digest = (part.split("=", 1)[1] for part in kwargs["headers"][notifications.SIGNATURE_HEADER].split(","))
+        self.assertEqual(digest, notifications.signature(self.endpoint.secret, int(timestamp), kwargs["data"]))
+        event = json.loads(kwargs["data"])["events"][0]
+        self.assertEqual((event["user_id"], event["status"], event["has_access"]), (self.user.id, "active", True))
+        self.assertFalse(EntitlementNotification.objects.exists())
+
+    def test_failed_delivery_is_retried_later(self):
+        self.session.post.side_effect = requests.ConnectionError("refused")
+        ledger.record([(self.user.id, self.tool.id, "", "active")], source="test")
+        self.assertEqual(notifications.deliver_pending(self.session), 1)
+
+        notification = EntitlementNotification.objects.get()
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertEqual(notifications.deliver_pending(self.session), 0)
+
+    def test_only_the_latest_status_is_sent(self):
+        ledger.record([(self.user.id, self.tool.id, "", "active")], source="test")
+        ledger.record([(self.user.id, self.tool.id, "active", "canceled")], source="test")
+        notifications.deliver_pending(self.session)
+
+        events = json.loads(self.session.post.call_args.kwargs["data"])["events"]
+        self.assertEqual([event["status"] for event in events], ["canceled"])
+
+
+class MeteringTests(TestCase):
+    def setUp(self):
+        self.tool = Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+        self.user = User.objects.create(username="ada@example.com", email="ada@example.com")
+        patcher = mock.patch.object(metering.Meter, "_ensure_flusher")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.meter = metering.Meter()
+
+    def test_events_are_combined_into_one_counter_row(self):
+        for _ in range(5):
+            self.meter.record(self.user.id, self.tool.id)
+        self.meter.record(self.user.id, self.tool.id, count=3)
+        self.assertFalse(UsageCounter.objects.exists())
+
+        self.assertEqual(self.meter.flush(), 1)
+        self.assertEqual(UsageCounter.objects.get().count, 8)
+        self.meter.record(self.user.id, self.tool.id)
+        self.meter.flush()
+        self.assertEqual(UsageCounter.objects.get().count, 9)
+
+    def test_usage_includes_pending_and_flushed_counts(self):
+        self.meter.record(self.user.id, self.tool.id, count=2)
+        self.meter.flush()
+        self.meter.record(self.user.id, self.tool.id, count=3)
+        self.assertEqual(self.meter.usage(self.user.id, self.tool.id), 5)
+        self.meter.record(self.user.id, self.tool.id)
+        self.assertEqual(self.meter.usage(self.user.id, self.tool.id), 6)
+
+    def test_failed_flush_keeps_the_counts(self):
+        self.meter.record(self.user.id, self.tool.id, count=4)
+        with mock.patch.object(metering, "_upsert", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.meter.flush()
+        self.meter.flush()
+        self.assertEqual(UsageCounter.objects.get().count, 4)
+
+
+class PriceMirrorTests(TestCase):
+    product = {"id": "prod_1", "name": "CrispWrite", "active": True}
+    price = {
+        "id": "price_crispwrite_monthly", "product": "prod_1", "active": True, "currency": "usd",
+        "unit_amount": 1900, "recurring": {"interval": "month", "interval_count": 1},
+    }
+
+    def setUp(self):
+        cache.clear()
+        catalog._local.update(catalog=None, checked_at=0.0, checking=False)
+        self.addCleanup(catalog._local.update, catalog=None, checked_at=0.0, checking=False)
+        Tool.objects.create(name="CrispWrite", description="", price_id="price_crispwrite_monthly")
+
+    def test_sync_mirrors_prices_into_the_catalog(self):
+        self.assertEqual(pricing.sync([self.product], [self.price]), {"products": (1, 0), "prices": (1, 0)})
+        self.assertEqual(pricing.sync([self.product], [self.price]), {"products": (0, 0), "prices": (0, 0)})
+
+        tool = json.loads(catalog.get_catalog().body)[0]
+        self.assertEqual(tool["price"]["unit_amount"], 1900)
+        self.assertEqual(tool["price"]["product_name"], "CrispWrite")
+
+    def test_sync_deletes_what_stripe_no_longer_lists(self):
+        pricing.sync([self.product], [self.price])
+        self.assertEqual(pricing.sync([], []), {"products": (0, 1), "prices": (0, 1)})
+        self.assertFalse(StripePrice.objects.exists())
+
+    def test_price_webhook_updates_the_mirror(self):
+        pricing.sync([self.product], [self.price])
+        webhooks.handle_event({"type": "price.updated", "data": {"object": dict(self.price, unit_amount=2900)}})
+        self.assertEqual(StripePrice.objects.get().unit_amount, 2900)
+        webhooks.handle_event({"type": "price.deleted", "data": {"object": self.price}})
+        self.assertFalse(StripePrice.objects.exists())
@@ -0,0 +1,38 @@
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import entitlements
+
+VERSION_CLAIM = "ent_ver"
+
+
+class EntitlementRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the user's entitlements.
+
+    Tool backends sharing the signing key can authorize requests from the
+    ``role`` and ``tools`` claims without calling back to this service.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["role"] = user.role
+        token["tools"] = sorted(entitlements.get_active_tool_ids(user.id))
+        token[VERSION_CLAIM] = user.entitlements_version
+        return token
+
+
+class InvitationTokenGenerator(PasswordResetTokenGenerator):
+    """Signs seat invitation links.
+
+    Its own salt keeps activation and password reset tokens from passing as
+    invitations, and hashing ``is_active`` in retires the link once the
+    account is activated.
+    """
+    key_salt = "payments.tokens.InvitationTokenGenerator"
+
+    def _make_hash_value(self, user, timestamp):
+        return f"{super()._make_hash_value(user, timestamp)}{user.is_active}"
+
+
+invitation_token_generator = InvitationTokenGenerator()
@@ -1,14 +1,29 @@
 
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_AUTH_VIEWS:
+    from . import async_views as auth_views
+else:
+    auth_views = views
+
+if settings.ASYNC_CHECKOUT_VIEW:
+    from . import async_views as checkout_views
+else:
+    checkout_views = views
+
 urlpatterns = [
-    path("register/", views.register, name="register"),
-    path("login/", views.login, name="login"),
+    path("register/", auth_views.register, name="register"),
+    path("login/", auth_views.login, name="login"),
     path("activate/<uidb64>/<token>/", views.activate, name="activate"),
-    path("stripe/create-checkout/", views.create_checkout, name="create-checkout"),
+    path("invite/accept/<uidb64>/<token>/", views.accept_invite, name="accept-invite"),
+    path("stripe/create-checkout/", checkout_views.create_checkout, name="create-checkout"),
     path("stripe/webhook/", views.stripe_webhook, name="stripe-webhook"),
     path("auth/check-subscription/", views.check_subscription, name="check-subscription"),
+    path("entitlements/batch/", views.batch_entitlements, name="batch-entitlements"),
+    path("seats/provision/", views.provision_seats, name="provision-seats"),
+    path("usage/", views.record_usage, name="record-usage"),
     path("agent/gateway/", views.agent_gateway, name="agent-gateway"),
     path("tools/", views.list_tools, name="list-tools"),
     path('cancel-subscription/', views.cancel_subscription, name='cancel-subscription'),
@@ -1,7 +1,8 @@
 
+from datetime import datetime, timezone
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.encoding import force_bytes, force_str
 from django.urls import reverse
 
 def generate_activation_link(user, request):
@@ -11,3 +12,27 @@ def generate_activation_link(user, request):
         reverse('activate', kwargs={'uidb64': uid, 'token': token})
     )
     return activation_url
+
+def encode_cursor(created_at, pk):
+    """Opaque keyset cursor pointing just past the row ``(created_at, pk)``."""
+    return urlsafe_base64_encode(f"{created_at.isoformat()}|{pk}".encode())
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``; raises ValueError on a malformed cursor."""
+    created_at, pk = force_str(urlsafe_base64_decode(cursor)).split("|")
+    return datetime.fromisoformat(created_at), int(pk)
+
+
+def stripe_timestamp(value):
+    """Aware datetime for a Stripe Unix timestamp, or None for a missing one."""
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
+
+
+def stripe_period_end(stripe_subscription):
+    """End of a Stripe subscription's current period, or None."""
+    # Newer API versions report the period on the subscription items.
+    if stripe_subscription.get("current_period_end"):
+        return stripe_timestamp(stripe_subscription["current_period_end"])
+    items = (stripe_subscription.get("items") or {}).get("data") or []
+    return stripe_timestamp(max((item.get("current_period_end") or 0 for item in items), default=0))
@@ -1,159 +1,53 @@
+import hashlib
+import json
 import stripe
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.views.decorators.http import condition
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth import authenticate
-from django.core.mail import EmailMultiAlternatives
-from .models import User, Tool, Subscription
-from .serializers import LoginSerializer,ToolSerializer
-from .utils import generate_activation_link
+from .authentication import CachedEntitlementJWTAuthentication, ServiceKeyAuthentication
+from .models import User, Subscription
+from .permissions import IsService
+from .tokens import invitation_token_generator
+from .utils import decode_cursor, encode_cursor
+from . import accounts, catalog, checkout, entitlements, ledger, metering, registry, seats, webhooks
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_str
-from django.urls import reverse
+from api.idempotency import idempotent
+from api.renderers import NDJSONRenderer
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+@idempotent
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def register(request):
     data = request.data
-    required_fields = ["first_name", "last_name", "email", "phone", "password", "repeat_password"]
+    error = accounts.validate_registration(data)
+    if error:
+        return Response({"error": error}, status=400)
 
-    for field in required_fields:
-        if not data.get(field):
-            return Response({"error": f"{field} is required"}, status=400)
-
-    if data["password"] != data["repeat_password"]:
-        return Response({"error": "Passwords do not match"}, status=400)
+    # Cheap indexed check first so a duplicate signup doesn't pay for a hash.
+    if User.objects.filter(username=data["email"]).exists():
+        return Response({"error": accounts.DUPLICATE_EMAIL_ERROR}, status=400)
 
     try:
-        user = User.objects.create(
-            username=data["email"],
-            email=data["email"],
-            password=make_password(data["password"]),
-            first_name=data["first_name"],
-            last_name=data["last_name"],
-            phone=data["phone"],
-            is_active=False 
-        )
-
-        activation_url = generate_activation_link(user, request)
-
-        html_body = f"""
-        <!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Welcome to CRISPAI</title>
-    <style>
-        body {{
-            margin: 0;
-            padding: 20px;
-            background: #f8fafc;
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            color: #333;
-        }}
-        .container {{
-            max-width: 600px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 12px;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-            overflow: hidden;
-        }}
-        .banner {{
-            background: #f1f5f9;
-            padding: 30px 20px;
-            text-align: center;
-            border-bottom: 1px solid #e2e8f0;
-        }}
-        .banner img {{
-            max-width: 180px;
-            height: auto;
-        }}
-        .content {{
-            padding: 40px 30px;
-            text-align: center;
-        }}
-        h1 {{
-            color: #002B5B;
-            font-size: 26px;
-            margin-top: 0;
-            margin-bottom: 20px;
-            font-weight: 600;
-        }}
-        p {{
-            font-size: 16px;
-            line-height: 1.6;
-            margin-bottom: 24px;
-            color: #4a5568;
-        }}
-        .button-container {{
-            margin: 32px 0;
-        }}
-        .activate-button {{
-            background-color: #002B5B;
-            color: white;
-            padding: 14px 28px;
-            text-decoration: none;
-            border-radius: 6px;
-            font-weight: 600;
-            display: inline-block;
-            font-size: 16px;
-        }}
-        .footer {{
-            text-align: center;
-            padding: 24px;
-            font-size: 13px;
-            color: #718096;
-            border-top: 1px solid #edf2f7;
-            background: #f8fafc;
-        }}
-        .footer a {{
-            color: #002B5B;
-            text-decoration: none;
-            font-weight: 500;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="banner">
-            <img src="https://crispai.crispvision.org/media/crisp-logo.png" alt="CRISP AI Logo">
-        </div>
-        <div class="content">
-            <h1>Hi {data['first_name']}, Welcome to CrispAI</h1>
-            <p>We're excited to have you on board!</p>
-            <p>Click the button below to activate your account:</p>
-            <div class="button-container">
-                <a href="{activation_url}" class="activate-button">Activate Account</a>
-            </div>
-            <p>If you didn't request this, please ignore this email.</p>
-        </div>
-        <div class="footer">
-            © 2024 CrispAI. All rights reserved.<br>
-            <a href="https://www.crispai.ca/">Visit our website</a> | <a href="mailto:support@crispai.ca">Contact Support</a>
-        </div>
-    </div>
-</body>
-</html>
-        """
-
-
-        subject = "🎉 Welcome to CRISP AI – Let’s Build the Future Together!"
-        text_body = f"Hi {data['first_name']},\n\nClick the link below to activate your account:\n\n{activation_url}"
-        from_email = settings.DEFAULT_FROM_EMAIL
-        msg = EmailMultiAlternatives(subject, text_body, from_email, [user.email])
-        msg.attach_alternative(html_body, "text/html")
-        msg.send()
-
+        accounts.create_inactive_user(data, make_password(data["password"]), request)
         return Response({"detail": "Registration successful. Please check your email to activate your account."})
     except Exception as e:
         return Response({"error": str(e)}, status=400)
@@ -183,32 +77,167 @@ def login(request):
     user = authenticate(request, username=email, password=password)
 
     if user is not None:
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            "refresh": str(refresh),
-            "access": str(refresh.access_token),
-            "user": {
-                "email": user.email,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "role": user.role if hasattr(user, 'role') else '',
-            }
-        })
+        return Response(accounts.login_payload(user))
     else:
         return Response({"detail": "Invalid credentials"}, status=401)
 
 @api_view(["GET"])
+@authentication_classes([CachedEntitlementJWTAuthentication, SessionAuthentication])
 @permission_classes([IsAuthenticated])
 def check_subscription(request):
-    user = request.user
-    active_subs = Subscription.objects.filter(user=user, status="active")
-    tools = [sub.tool.id for sub in active_subs]
+    # Polled by every tool frontend: the token is checked against the cached
+    # user state instead of a user row, so a warm poll is two cache hits and
+    # no queries.
+    tools = sorted(entitlements.get_active_tool_ids(request.user.id))
 
     return Response({
         "has_access": len(tools) > 0,
         "tools": tools
     })
 
+@api_view(["POST"])
+@authentication_classes([ServiceKeyAuthentication])
+@permission_classes([IsService])
+@renderer_classes([JSONRenderer, NDJSONRenderer])
+def batch_entitlements(request):
+    """Entitlements of many users for our tool backends, in one call.
+
+    Takes ``user_ids`` or ``emails`` and an optional ``tool_id``. Send
+    ``Accept: application/x-ndjson`` to get one JSON record per line,
+    streamed as it is computed, which allows much longer lists.
+    """
+    user_ids = request.data.get("user_ids")
+    emails = request.data.get("emails")
+    if (user_ids is None) == (emails is None):
+        return Response({"detail": "Provide either user_ids or emails"}, status=400)
+    identifiers = user_ids if user_ids is not None else emails
+    if not isinstance(identifiers, list):
+        return Response({"detail": "user_ids and emails must be lists"}, status=400)
+    # bool is an int subclass, but True is no user ID.
+    if user_ids is not None and not all(type(user_id) is int for user_id in user_ids):
+        return Response({"detail": "user_ids must be integers"}, status=400)
+    if emails is not None and not all(isinstance(email, str) for email in emails):
+        return Response({"detail": "emails must be strings"}, status=400)
+
+    stream = request.accepted_renderer.format == NDJSONRenderer.format
+    limit = settings.ENTITLEMENT_BATCH_STREAM_MAX if stream else settings.ENTITLEMENT_BATCH_MAX
+    if len(identifiers) > limit:
+        return Response({"detail": f"At most {limit} users per request"}, status=400)
+
+    tool_id = None
+    if request.data.get("tool_id"):
+        tool = registry.get_tool(request.data["tool_id"])
+        if tool is None:
+            return Response({"detail": "Tool not found"}, status=404)
+        tool_id = tool.id
+
+    records = entitlements.lookup(identifiers, by="user_id" if user_ids is not None else "email", tool_id=tool_id)
+    if stream:
+        return StreamingHttpResponse(
+            (json.dumps(record) + "\n" for record in records), content_type="application/x-ndjson"
+        )
+    return Response({"results": list(records)})
+
+@api_view(["POST"])
+@authentication_classes([ServiceKeyAuthentication])
+@permission_classes([IsService])
+def record_usage(request):
+    """Meter uses of a tool, reported by its backend.
+
+    Takes ``user_id``, ``tool_id`` and an optional ``count`` (default 1).
+    With a ``limit``, nothing is recorded once the month's usage would go
+    over it. Returns the month's usage and whether the uses were allowed.
+    """
+    try:
+        user_id = int(request.data.get("user_id"))
+        count = int(request.data.get("count", 1))
+        limit = request.data.get("limit")
+        limit = None if limit is None else int(limit)
+    except (TypeError, ValueError):
+        return Response({"detail": "user_id, count and limit must be integers"}, status=400)
+    if count < 0:
+        return Response({"detail": "count must not be negative"}, status=400)
+    tool = registry.get_tool(request.data.get("tool_id") or "")
+    if tool is None:
+        return Response({"detail": "Tool not found"}, status=404)
+
+    allowed = limit is None or metering.within_quota(user_id, tool.id, limit, count)
+    if allowed and count:
+        metering.record(user_id, tool.id, count)
+    return Response({"used": metering.usage(user_id, tool.id), "allowed": allowed})
+
+@api_view(["POST"])
+@authentication_classes([ServiceKeyAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+@permission_classes([IsService | IsAdminUser])
+def provision_seats(request):
+    """Subscribe a team to a tool, inviting the members who have no account.
+
+    Takes JSON ``{"tool_id": ..., "members": [{"email", "first_name",
+    "last_name", "phone"}, ...]}``, or the same columns as CSV, either as a
+    ``text/csv`` body with ``?tool_id=`` or as a ``file`` upload. Nothing is
+    provisioned if any row is invalid.
+    """
+    try:
+        if request.content_type.startswith("text/csv"):
+            tool_input = request.query_params.get("tool_id")
+            rows = seats.parse_csv(request.body.decode("utf-8-sig"))
+        elif "file" in request.FILES:
+            tool_input = request.data.get("tool_id")
+            rows = seats.parse_csv(request.FILES["file"].read().decode("utf-8-sig"))
+        else:
+            tool_input = request.data.get("tool_id")
+            rows = request.data.get("members")
+            if not isinstance(rows, list):
+                return Response({"detail": "members must be a list"}, status=400)
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({"detail": str(e)}, status=400)
+
+    if not tool_input:
+        return Response({"detail": "Missing tool_id"}, status=400)
+    tool = registry.get_tool(tool_input)
+    if tool is None:
+        return Response({"detail": "Tool not found"}, status=404)
+    if len(rows) > settings.SEAT_PROVISION_MAX:
+        return Response({"detail": f"At most {settings.SEAT_PROVISION_MAX} members per request"}, status=400)
+
+    members, errors = seats.clean_members(rows)
+    if errors:
+        return Response({"detail": "Invalid members", "errors": errors}, status=400)
+
+    created = subscribed = 0
+    for chunk_created, chunk_subscribed in seats.provision(members, tool):
+        created += chunk_created
+        subscribed += chunk_subscribed
+    return Response({"members": len(members), "invited": created, "subscribed": subscribed})
+
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def accept_invite(request, uidb64, token):
+    """Let an invited member choose a password, then log them in."""
+    password = request.data.get("password")
+    if not password:
+        return Response({"error": "password is required"}, status=400)
+    if password != request.data.get("repeat_password"):
+        return Response({"error": "Passwords do not match"}, status=400)
+
+    try:
+        user = User.objects.get(pk=force_str(urlsafe_base64_decode(uidb64)))
+    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+        user = None
+    # Only a provisioned account that was never activated can be claimed;
+    # the token is also bound to its unusable password and inactive state.
+    if (
+        user is None
+        or user.is_active
+        or user.has_usable_password()
+        or not invitation_token_generator.check_token(user, token)
+    ):
+        return Response({"error": "Invitation link is invalid or expired."}, status=400)
+
+    seats.accept_invitation(user, password)
+    return Response(accounts.login_payload(user))
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def agent_gateway(request):
@@ -217,6 +246,7 @@ def agent_gateway(request):
         return redirect("https://www.crispai.ca/agent-dashboard")
     return Response({"detail": "Unauthorized"}, status=403)
 
+@idempotent
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_checkout(request):
@@ -227,32 +257,24 @@ def create_checkout(request):
         return Response({"detail": "Missing tool_id"}, status=400)
 
     try:
-        # Check if the tool_input is a digit (numeric ID), otherwise use name
-        if str(tool_input).isdigit():
-            tool = Tool.objects.get(id=int(tool_input))
-        else:
-            tool = Tool.objects.get(name__iexact=tool_input)
+        # Numeric IDs and case-insensitive names are resolved from memory.
+        tool = registry.get_tool(tool_input)
+        if tool is None:
+            return Response({"detail": "Tool not found"}, status=404)
 
-        if Subscription.objects.filter(user=user, tool=tool, status="active").exists():
+        if Subscription.objects.filter(user=user, tool_id=tool.id, status="active").exists():
             return Response({"detail": "Already subscribed"}, status=400)
 
-        session = stripe.checkout.Session.create(
-            customer_email=user.email,
-            payment_method_types=["card"],
-            line_items=[{
-                'price': tool.price_id,
-                'quantity': 1
-            }],
-            mode='subscription',
-            subscription_data={"trial_period_days": 7},
-             success_url="https://marketplace.crispai.ca/?status=success&session_id={CHECKOUT_SESSION_ID}",
-            cancel_url="http://localhost:8080/cancel",
-            metadata={"tool_id": str(tool.id)}
-        )
-        return Response({"checkout_url": session.url})
+        def create_session():
+            return stripe.checkout.Session.create(**checkout.session_params(user, tool))
 
-    except Tool.DoesNotExist:
-        return Response({"detail": "Tool not found"}, status=404)
+        # Double clicks and reloads get the still-open session back.
+        checkout_url = checkout.get_or_create_session_url(user.id, tool.id, create_session)
+        return Response({"checkout_url": checkout_url})
+
+    except checkout.CheckoutInProgress:
+        return Response({"detail": "Checkout is already being created, please retry"}, status=409,
+                        headers={"Retry-After": "1"})
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
@@ -268,37 +290,37 @@ def stripe_webhook(request):
         print("Invalid webhook signature:", e)
         return HttpResponse(status=400)
 
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        email = session.get("customer_email")
-        tool_id = session.get("metadata", {}).get("tool_id")
-
-        try:
-            user = User.objects.get(email=email)
-            tool = Tool.objects.get(id=tool_id)
-
-            Subscription.objects.update_or_create(
-                user=user,
-                tool=tool,
-                defaults={
-                    "status": "active",
-                    "email": email
-                }
-            )
-        except Exception as e:
-            print("Webhook processing error:", e)
-            return HttpResponse(status=400)
+    # Only record the event here; process_webhooks applies it later.
+    webhooks.record_event(json.loads(payload))
 
     return HttpResponse(status=200)
 
 
 
 @api_view(["GET"])
+@authentication_classes([])
 @permission_classes([AllowAny])
 def list_tools(request):
-    tools = Tool.objects.all()
-    serializer = ToolSerializer(tools, many=True)
-    return Response(serializer.data)
+    try:
+        tools = catalog.get_catalog()
+    except DatabaseError:
+        return Response({"detail": "Tool catalog is temporarily unavailable"}, status=503)
+
+    last_modified = tools.last_modified and int(tools.last_modified.timestamp())
+    response = get_conditional_response(request, etag=quote_etag(tools.etag), last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(tools.body, content_type="application/json")
+    response["ETag"] = quote_etag(tools.etag)
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.CATALOG_MAX_AGE,
+        stale_while_revalidate=settings.CATALOG_MAX_AGE,
+        stale_if_error=86400,
+    )
+    return response
 
 
 @api_view(["GET"])
@@ -354,8 +376,11 @@ def cancel_subscription(request):
         )
         
         # Update the subscription status to canceled
-        subscription.status = "canceled"
-        subscription.save()
+        with transaction.atomic():
+            subscription.status = "canceled"
+            subscription.save()
+            ledger.record([(user.id, subscription.tool_id, "active", "canceled")], source="cancel")
+        entitlements.revoke(user.id)
         
         return Response({"detail": "Subscription canceled successfully"})
         
@@ -364,19 +389,58 @@ def cancel_subscription(request):
     except Exception as e:
         return Response({"error": str(e)}, status=500)
     
+def _subscriptions_etag(request):
+    # Any insert, update or delete moves the latest updated_at or the count.
+    # The rows carry tool names, so the catalog version (from memory) is
+    # part of it too.
+    state = Subscription.objects.filter(user=request.user).aggregate(
+        last_updated=Max("updated_at"), count=Count("id")
+    )
+    fingerprint = (
+        f"{request.user.id}:{state['last_updated']}:{state['count']}:"
+        f"{catalog.get_catalog().version}:{request.GET.urlencode()}"
+    )
+    return hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest()
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=_subscriptions_etag)
 def my_subscriptions(request):
-    user = request.user
-    subscriptions = Subscription.objects.filter(user=user)
-    
+    # One joined query per page, keyset-paginated on (created_at, id). The
+    # body stays a plain list; the next page is advertised in a Link header.
+    page_size = api_settings.PAGE_SIZE
+    subscriptions = (
+        Subscription.objects.filter(user=request.user)
+        .order_by("created_at", "id")
+        .values("id", "tool_id", "tool__name", "status", "created_at", "updated_at")
+    )
+
+    cursor = request.query_params.get("cursor")
+    if cursor:
+        try:
+            created_at, pk = decode_cursor(cursor)
+        except ValueError:
+            return Response({"detail": "Invalid cursor"}, status=400)
+        subscriptions = subscriptions.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        )
+
+    rows = list(subscriptions[:page_size + 1])
     data = [{
-        "id": sub.id,
-        "tool": sub.tool.name,
-        "tool_id": sub.tool.id,
-        "status": sub.status,
-        "created_at": sub.created_at,
-        "updated_at": sub.updated_at
-    } for sub in subscriptions]
-    
-    return Response(data)
\ No newline at end of file
+        "id": row["id"],
+        "tool": row["tool__name"],
+        "tool_id": row["tool_id"],
+        "status": row["status"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"]
+    } for row in rows[:page_size]]
+
+    response = Response(data)
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "cursor", encode_cursor(last["created_at"], last["id"])
+        )
+        response["Link"] = f'<{next_url}>; rel="next"'
+    return response
@@ -0,0 +1,186 @@
+import logging
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone as django_timezone
+
+from .models import User, Tool, Subscription, WebhookEvent
+from . import checkout, entitlements, ledger, pricing
+from .reconcile import STRIPE_STATUSES
+from .utils import stripe_period_end, stripe_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Retry delays grow as BACKOFF_BASE * 2 ** attempts, capped at BACKOFF_MAX.
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+
+
+def _session_user(session):
+    """Find the user a Checkout Session belongs to with an indexed lookup.
+
+    Sessions carry our user ID in ``client_reference_id``; older ones are
+    matched on the Stripe customer, then on the email used as username.
+    """
+    if str(session.get("client_reference_id") or "").isdigit():
+        return User.objects.filter(pk=int(session["client_reference_id"])).first()
+    if session.get("customer"):
+        user = User.objects.filter(stripe_customer_id=session["customer"]).first()
+        if user is not None:
+            return user
+    email = session.get("customer_email") or (session.get("customer_details") or {}).get("email")
+    return User.objects.filter(username=email).first() if email else None
+
+
+def checkout_session_completed(event):
+    session = event["data"]["object"]
+    tool_id = session.get("metadata", {}).get("tool_id")
+
+    user = _session_user(session)
+    if user is None:
+        raise User.DoesNotExist(f"No user for checkout session {session.get('id')}")
+    tool = Tool.objects.get(id=tool_id)
+
+    if session.get("customer") and not user.stripe_customer_id:
+        user.stripe_customer_id = session["customer"]
+        user.save(update_fields=["stripe_customer_id"])
+
+    previous = (
+        Subscription.objects.select_for_update()
+        .filter(user=user, tool=tool)
+        .values_list("status", flat=True)
+        .first()
+    )
+    # The trial starts now; customer.subscription.* events refine the dates.
+    trial_ends_at = django_timezone.now() + timedelta(days=checkout.TRIAL_PERIOD_DAYS)
+    defaults = {
+        "status": "active",
+        "email": session.get("customer_email") or user.email,
+        "trial_ends_at": trial_ends_at,
+        "current_period_end": trial_ends_at,
+    }
+    if session.get("subscription"):
+        defaults["stripe_subscription_id"] = session["subscription"]
+    Subscription.objects.update_or_create(user=user, tool=tool, defaults=defaults)
+    if previous != "active":
+        ledger.record([(user.id, tool.id, previous or "", "active")], source="webhook")
+    transaction.on_commit(partial(entitlements.invalidate, user.id))
+    checkout.forget_session(user.id, tool.id)
+
+
+def checkout_session_expired(event):
+    session = event["data"]["object"]
+    tool_id = session.get("metadata", {}).get("tool_id")
+
+    user = _session_user(session)
+    if user is not None and tool_id:
+        checkout.forget_session(user.id, tool_id)
+
+
+def customer_subscription_changed(event):
+    stripe_subscription = event["data"]["object"]
+    status = "canceled" if event["type"] == "customer.subscription.deleted" else stripe_subscription.get("status")
+    status = STRIPE_STATUSES.get(status)
+
+    subscription = (
+        Subscription.objects.select_for_update()
+        .filter(stripe_subscription_id=stripe_subscription["id"])
+        .first()
+    )
+    if subscription is None:
+        return
+    previous = subscription.status
+    subscription.trial_ends_at = stripe_timestamp(stripe_subscription.get("trial_end")) or subscription.trial_ends_at
+    subscription.current_period_end = stripe_period_end(stripe_subscription) or subscription.current_period_end
+    if status is not None:
+        subscription.status = status
+    subscription.save(update_fields=["status", "trial_ends_at", "current_period_end", "updated_at"])
+    if subscription.status == previous:
+        return
+
+    ledger.record([(subscription.user_id, subscription.tool_id, previous, subscription.status)], source="webhook")
+    if previous == "active":
+        entitlements.revoke(subscription.user_id)
+    else:
+        transaction.on_commit(partial(entitlements.invalidate, subscription.user_id))
+
+
+HANDLERS = {
+    "checkout.session.completed": checkout_session_completed,
+    "checkout.session.expired": checkout_session_expired,
+    "customer.subscription.updated": customer_subscription_changed,
+    "customer.subscription.deleted": customer_subscription_changed,
+    "price.created": pricing.price_changed,
+    "price.updated": pricing.price_changed,
+    "price.deleted": pricing.price_changed,
+    "product.created": pricing.product_changed,
+    "product.updated": pricing.product_changed,
+    "product.deleted": pricing.product_changed,
+}
+
+
+def handle_event(event):
+    """Apply a Stripe event payload. Event types we don't act on are ignored."""
+    handler = HANDLERS.get(event["type"])
+    if handler is not None:
+        handler(event)
+
+
+def record_event(event):
+    """Store a verified event in the inbox.
+
+    Stripe retries and replays reuse the event ID, so a duplicate delivery
+    finds the existing row and is dropped.
+    """
+    WebhookEvent.objects.get_or_create(
+        event_id=event["id"],
+        defaults={
+            "type": event["type"],
+            "payload": event,
+            "created": stripe_timestamp(event["created"]),
+        }
+    )
+
+
+def process_pending(batch_size=100, max_attempts=5):
+    """Apply the oldest unprocessed inbox events in Stripe ``created`` order.
+
+    Rows are locked with SKIP LOCKED where the database supports it, so
+    several workers can drain the inbox side by side. Each event runs in its
+    own savepoint; a failure is recorded on the row and retried with
+    exponential backoff. After ``max_attempts`` failures the event is marked
+    dead and logged; dead events are listed in the admin, which can replay
+    them. Returns the number of events examined.
+    """
+    with transaction.atomic():
+        now = django_timezone.now()
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, dead_at__isnull=True, next_attempt_at__lte=now)
+            .order_by("created", "id")[:batch_size]
+        )
+        for inbox_event in events:
+            inbox_event.attempts += 1
+            try:
+                with transaction.atomic():
+                    handle_event(inbox_event.payload)
+            except Exception as e:
+                inbox_event.last_error = f"{type(e).__name__}: {e}"
+                if inbox_event.attempts >= max_attempts:
+                    inbox_event.dead_at = now
+                    logger.error(
+                        "Webhook event %s (%s) failed %d times, giving up: %s",
+                        inbox_event.event_id, inbox_event.type, inbox_event.attempts, inbox_event.last_error,
+                    )
+                else:
+                    inbox_event.next_attempt_at = now + min(
+                        BACKOFF_BASE * 2 ** (inbox_event.attempts - 1), BACKOFF_MAX
+                    )
+            else:
+                inbox_event.processed_at = now
+                inbox_event.last_error = ""
+        WebhookEvent.objects.bulk_update(
+            events, ["attempts", "processed_at", "next_attempt_at", "dead_at", "last_error"]
+        )
+    return len(events)
@@ -0,0 +1,80 @@
+"""Load test the async create_checkout against the fake Stripe server.
+
+    python scripts/bench_async_checkout.py --requests 200 --latency 0.5
+
+Runs the ASGI app in process, with Stripe replaced by scripts/fake_stripe.py
+answering after ``--latency`` seconds, and fires every request at once from
+distinct users. Reports how many got a checkout URL, how many were turned
+away with a 503 once STRIPE_MAX_IN_FLIGHT calls were pending, and latencies.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+
+from benchutil import create_test_db, setup_django
+from fake_stripe import serve
+
+
+async def fire(app, tokens, tool_id):
+    import httpx
+
+    async def one(client, token):
+        began = time.perf_counter()
+        response = await client.post(
+            "/api/stripe/create-checkout/", json={"tool_id": tool_id},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        return response.status_code, time.perf_counter() - began
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await asyncio.gather(*(one(client, token) for token in tokens))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = serve(latency=args.latency)
+    os.environ["STRIPE_API_BASE"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_fake")
+    os.environ["ASYNC_CHECKOUT_VIEW"] = "True"
+    setup_django()
+    create_test_db()
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+    from django.urls import get_resolver
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from payments.models import Tool, User
+
+    tool = Tool.objects.create(name="Bench Tool", description="", price_id="price_bench")
+    User.objects.bulk_create(
+        User(username=f"bench{n}@example.com", email=f"bench{n}@example.com", is_active=True)
+        for n in range(args.requests)
+    )
+    tokens = [str(RefreshToken.for_user(user).access_token) for user in User.objects.all()]
+
+    # Load the URLconf up front and keep 503s out of the output.
+    app = get_asgi_application()
+    get_resolver().url_patterns
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+    began = time.perf_counter()
+    results = asyncio.run(fire(app, tokens, tool.id))
+    elapsed = time.perf_counter() - began
+
+    print(f"{args.requests} requests, Stripe latency {args.latency}s, "
+          f"STRIPE_MAX_IN_FLIGHT={settings.STRIPE_MAX_IN_FLIGHT}: {elapsed:.2f}s total")
+    for status, count in sorted(Counter(status for status, _ in results).items()):
+        latencies = sorted(latency for s, latency in results if s == status)
+        print(f"  {status}: {count:5} requests, median {latencies[len(latencies) // 2] * 1000:7.1f} ms, "
+              f"max {latencies[-1] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
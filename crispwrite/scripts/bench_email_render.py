@@ -0,0 +1,46 @@
+"""Per-message cost of rendering the activation email.
+
+    python scripts/bench_email_render.py
+
+Compares the old approach (an f-string over the whole document, rebuilt on
+every call), parsing the template on every send, and the precompiled
+EmailTemplate used by register. The EmailTemplate figure includes the text
+body as well as the HTML one the others render.
+"""
+import argparse
+from pathlib import Path
+
+from benchutil import measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.template import Context, Template
+    from payments import emails
+
+    source = (Path(__file__).resolve().parent.parent / "payments/templates/emails/activation.html").read_text()
+    legacy = (
+        source.replace("{", "{{").replace("}", "}}")
+        .replace("{{{{ first_name }}}}", "{first_name}")
+        .replace("{{{{ activation_url }}}}", "{activation_url}")
+    )
+    context = {
+        "first_name": "Ada",
+        "activation_url": "https://crispai.ca/api/activate/MQ/cf3k2x-0123456789abcdef0123456789abcdef/",
+    }
+
+    results = {
+        "f-string per call (before)": measure(lambda: legacy.format(**context), args.repeat),
+        "parse template per call": measure(lambda: Template(source).render(Context(context)), args.repeat // 10),
+        "precompiled EmailTemplate (after)": measure(lambda: emails.ACTIVATION.render(**context), args.repeat),
+    }
+    for name, latency in results.items():
+        print(f"{name:36} {latency:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
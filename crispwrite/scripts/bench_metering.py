@@ -0,0 +1,50 @@
+"""Throughput of usage metering against one database write per event.
+
+    python scripts/bench_metering.py --events 500000 --users 2000
+
+Events are spread over ``--users`` users of one tool. The per-event path is
+a single-row upsert, timed on a sample; the metered path is
+``metering.record`` for every event followed by one flush.
+"""
+import argparse
+import time
+
+from benchutil import create_test_db, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--sample", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    create_test_db()
+    from django.utils import timezone
+    from payments import metering
+    from payments.models import Tool
+
+    tool = Tool.objects.create(name="Bench Tool", description="", price_id="price_bench")
+    bucket = metering.bucket_start(timezone.now())
+
+    began = time.perf_counter()
+    for n in range(args.sample):
+        metering._upsert([(n % args.users, tool.id, bucket, 1)])
+    per_event = (time.perf_counter() - began) / args.sample
+
+    began = time.perf_counter()
+    for n in range(args.events):
+        metering.record(n % args.users, tool.id)
+    recorded = time.perf_counter() - began
+    began = time.perf_counter()
+    rows = metering.flush()
+    flushed = time.perf_counter() - began
+
+    print(f"upsert per event (before): {1 / per_event:10.0f} events/s")
+    print(f"metering.record (after):   {args.events / recorded:10.0f} events/s, "
+          f"flush of {rows} counter rows in {flushed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Per-request overhead of the rate limiter on the login route.
+
+    python scripts/bench_ratelimit.py
+    REDIS_URL=redis://localhost:6379/0 python scripts/bench_ratelimit.py
+
+Times ``RateLimitMiddleware.process_view`` for a JSON login request, which
+checks both the ip and the email dimension, against the configured cache.
+Requests are spread over many addresses and emails so none is rejected.
+"""
+import argparse
+import itertools
+import json
+
+from benchutil import measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=5_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import RequestFactory
+    from django.urls import resolve
+    from api.ratelimit import RateLimitMiddleware
+
+    settings.RATE_LIMITS = {"login": {"ip": "1000000/m", "email": "1000000/m"}}
+    middleware = RateLimitMiddleware(lambda request: None)
+    factory = RequestFactory()
+    match = resolve("/api/login/")
+
+    def make_request(n):
+        body = json.dumps({"email": f"user{n}@example.com", "password": "x"})
+        request = factory.post("/api/login/", body, content_type="application/json", REMOTE_ADDR=f"10.0.{n // 256 % 256}.{n % 256}")
+        request.resolver_match = match
+        return request
+
+    requests = itertools.cycle([make_request(n) for n in range(args.clients)])
+    baseline = measure(lambda: next(requests), args.repeat)
+    limited = measure(lambda: middleware.process_view(next(requests), None, (), {}), args.repeat)
+    print(f"cache backend: {settings.CACHES['default']['BACKEND']}")
+    print(f"rate limit check (ip + email): {limited - baseline:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Time provisioning a team's seats in bulk against one signup per seat.
+
+    python scripts/bench_seat_provisioning.py --seats 5000
+
+The per-seat path is what a team purchase cost before: a password hash and
+a user plus activation email per member, and a subscription written per
+member as the webhook did. It is timed on a sample and extrapolated.
+"""
+import argparse
+import time
+
+from benchutil import create_test_db, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seats", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--sample", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    create_test_db()
+    from django.contrib.auth.hashers import make_password
+    from django.test import RequestFactory
+    from payments import accounts, seats
+    from payments.models import Subscription, Tool
+
+    tool = Tool.objects.create(name="Bench Tool", description="", price_id="price_bench")
+    request = RequestFactory().post("/api/register/")
+
+    began = time.perf_counter()
+    for n in range(args.sample):
+        data = {
+            "email": f"single{n}@example.com", "first_name": "Ada", "last_name": "Lovelace",
+            "phone": "555-0100", "password": "correct horse battery staple",
+        }
+        user = accounts.create_inactive_user(data, make_password(data["password"]), request)
+        Subscription.objects.create(user=user, tool=tool, status="active", email=user.email)
+    per_seat = (time.perf_counter() - began) / args.sample
+
+    rows = [
+        {"email": f"seat{n}@example.com", "first_name": "Ada", "last_name": "Lovelace", "phone": "555-0100"}
+        for n in range(args.seats)
+    ]
+    began = time.perf_counter()
+    members, _ = seats.clean_members(rows)
+    totals = [sum(counts) for counts in zip(*seats.provision(members, tool, chunk_size=args.chunk_size))]
+    elapsed = time.perf_counter() - began
+
+    print(f"one signup per seat (before): {per_seat * args.seats:8.1f}s for {args.seats} seats "
+          f"(extrapolated from {args.sample}, without SMTP)")
+    print(f"bulk provisioning (after):    {elapsed:8.1f}s, {totals[0]} invited, {totals[1]} subscribed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Query plans and latency of the Subscription hot lookups with and without
+the composite indexes and unique (user, tool) constraint.
+
+    python scripts/bench_subscription_indexes.py --users 200000 --tools 5
+
+Users times tools rows are generated, so the defaults give 1M subscriptions.
+"""
+import argparse
+import random
+
+from benchutil import create_test_db, measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--tools", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.utils import timezone
+    from payments.models import Subscription, Tool, User
+
+    # Build the table without the new indexes and constraint; they are added
+    # back after the "before" measurements.
+    indexes, constraints = Subscription._meta.indexes, Subscription._meta.constraints
+    Subscription._meta.indexes, Subscription._meta.constraints = [], []
+    connection = create_test_db(migrate=False)
+
+    print(f"Generating {args.users * args.tools:,} subscriptions...")
+    now = timezone.now().isoformat()
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {Tool._meta.db_table} (name, description, price_id, is_active, created_at, updated_at)"
+            " VALUES (%s, '', %s, TRUE, %s, %s)",
+            [(f"tool-{t}", f"price_{t}", now, now) for t in range(args.tools)],
+        )
+        cursor.executemany(
+            f"INSERT INTO {User._meta.db_table} (password, is_superuser, username, first_name, last_name,"
+            " email, is_staff, date_joined, role, is_active, entitlements_version)"
+            " VALUES ('!', FALSE, %s, '', '', %s, FALSE, %s, 'user', TRUE, 0)",
+            [(f"u{u}@example.com", f"u{u}@example.com", now) for u in range(args.users)],
+        )
+        tool_ids = list(Tool.objects.values_list("id", flat=True))
+        first_user = User.objects.order_by("id").values_list("id", flat=True).first()
+        statuses = ["active", "active", "active", "canceled"]
+        for start in range(0, args.users, 10_000):
+            cursor.executemany(
+                f"INSERT INTO {Subscription._meta.db_table} (user_id, tool_id, status, email, created_at, updated_at)"
+                " VALUES (%s, %s, %s, '', %s, %s)",
+                [
+                    (first_user + u, tool_id, random.choice(statuses), now, now)
+                    for u in range(start, min(start + 10_000, args.users))
+                    for tool_id in tool_ids
+                ],
+            )
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Subscription._meta.db_table}")
+
+    users = [first_user + random.randrange(args.users) for _ in range(args.repeat)]
+    tool_id = tool_ids[0]
+
+    # The lookup each endpoint makes, as a queryset for a given user ID.
+    # exists() is spelled as [:1] so the same queryset can be explained.
+    queries = {
+        "check_subscription": lambda u: Subscription.objects.filter(
+            user_id=u, status="active"
+        ).values_list("tool_id", flat=True),
+        "create_checkout exists": lambda u: Subscription.objects.filter(
+            user_id=u, tool_id=tool_id, status="active"
+        ).values("id")[:1],
+        "cancel_subscription": lambda u: Subscription.objects.filter(
+            user_id=u, tool_id=tool_id, status="active"
+        ),
+        "my_subscriptions": lambda u: Subscription.objects.filter(user_id=u),
+        "webhook update_or_create": lambda u: Subscription.objects.filter(user_id=u, tool_id=tool_id),
+    }
+
+    def run(label):
+        print(f"\n=== {label} ===")
+        for name, query in queries.items():
+            picks = iter(users)
+            latency = measure(lambda: list(query(next(picks))), args.repeat)
+            plan = " | ".join(query(users[0]).explain().splitlines())
+            print(f"{name:26} {latency:8.1f} us   {plan}")
+
+    run("before: user_id foreign key index only")
+
+    Subscription._meta.indexes, Subscription._meta.constraints = indexes, constraints
+    with connection.schema_editor() as editor:
+        for index in indexes:
+            editor.add_index(Subscription, index)
+        for constraint in constraints:
+            # Plain DDL, so SQLite doesn't rebuild the table from _meta.
+            editor.execute(constraint.create_sql(Subscription, editor))
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Subscription._meta.db_table}")
+    run("after: composite indexes and unique (user, tool)")
+
+
+if __name__ == "__main__":
+    main()
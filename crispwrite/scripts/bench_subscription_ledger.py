@@ -0,0 +1,80 @@
+"""Point-in-time subscription queries on a large ledger.
+
+    python scripts/bench_subscription_ledger.py --events 2000000
+
+Fills the ledger with a year of random status changes, compacts it into a
+snapshot a month before the query date and compares "who was active on day
+X" answered by replaying the whole ledger with the snapshot plus delta read.
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from benchutil import create_test_db, measure, setup_django
+
+
+def fill_ledger(connection, events, users, tools, start):
+    from payments.models import SubscriptionEvent
+
+    table = SubscriptionEvent._meta.db_table
+    sql = (
+        f"INSERT INTO {table} (user_id, tool_id, old_status, status, source, occurred_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s)"
+    )
+    rng = random.Random(0)
+    step = timedelta(days=365) / events
+    batch = []
+    with connection.cursor() as cursor:
+        for n in range(events):
+            status = "active" if rng.random() < 0.6 else "canceled"
+            batch.append((
+                rng.randrange(1, users + 1), rng.randrange(1, tools + 1), "", status, "bench", start + step * n,
+            ))
+            if len(batch) == 50_000:
+                cursor.executemany(sql, batch)
+                batch = []
+        cursor.executemany(sql, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--tools", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.utils import timezone
+    from payments import ledger
+    from payments.models import SubscriptionEvent
+
+    connection = create_test_db()
+    start = timezone.now() - timedelta(days=365)
+    began = time.perf_counter()
+    fill_ledger(connection, args.events, args.users, args.tools, start)
+    print(f"ledger: {args.events} events in {time.perf_counter() - began:.1f}s")
+
+    began = time.perf_counter()
+    snapshot = ledger.take_snapshot(start + timedelta(days=300))
+    print(f"snapshot: {snapshot.entries.count()} entries in {time.perf_counter() - began:.1f}s")
+
+    at = start + timedelta(days=330)
+
+    def full_replay():
+        state = ledger._replay(SubscriptionEvent.objects.filter(occurred_at__lte=at))
+        return {pair for pair, status in state.items() if status == "active"}
+
+    assert full_replay() == ledger.active_at(at)
+    results = {
+        "replay whole ledger (before)": measure(full_replay, args.repeat),
+        "snapshot + delta (after)": measure(lambda: ledger.active_at(at), args.repeat),
+        "snapshot + delta, one tool": measure(lambda: ledger.active_at(at, tool_id=1), args.repeat),
+    }
+    for name, latency in results.items():
+        print(f"{name:30} {latency / 1000:10.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Time sweep_subscriptions on a large cohort of lapsed trials.
+
+    python scripts/bench_trial_sweep.py --subscriptions 200000
+
+Half of the cohort is a trial that ended without payment, a quarter is a
+paid period that lapsed and a quarter is still current. The set-based
+sweep is compared with loading and saving each row, timed on a sample.
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from benchutil import create_test_db, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscriptions", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    create_test_db()
+    from django.utils import timezone
+    from payments import lifecycle
+    from payments.models import Subscription, Tool, User
+
+    now = timezone.now()
+    tool = Tool.objects.create(name="Bench Tool", description="", price_id="price_bench")
+    User.objects.bulk_create(
+        (User(username=f"trial{n}@example.com", email=f"trial{n}@example.com") for n in range(args.subscriptions)),
+        batch_size=5000,
+    )
+
+    def subscription(n, user_id):
+        trial_ends_at = now - timedelta(days=3 + n % 20)
+        if n % 4 in (0, 1):
+            period_end = trial_ends_at
+        elif n % 4 == 2:
+            period_end = trial_ends_at + timedelta(days=1)
+        else:
+            period_end = now + timedelta(days=20)
+        return Subscription(
+            user_id=user_id, tool=tool, status="active", email="bench@example.com",
+            trial_ends_at=trial_ends_at, current_period_end=period_end,
+        )
+
+    user_ids = User.objects.order_by("id").values_list("id", flat=True).iterator()
+    Subscription.objects.bulk_create(
+        (subscription(n, user_id) for n, user_id in enumerate(user_ids)), batch_size=5000
+    )
+    print(f"cohort: {args.subscriptions} active subscriptions")
+
+    cutoff = now - lifecycle.GRACE_PERIOD
+    began = time.perf_counter()
+    for sub in Subscription.objects.filter(status="active", current_period_end__lt=cutoff)[:args.sample]:
+        sub.status = "expired"
+        sub.save()
+    per_row = (time.perf_counter() - began) / args.sample
+    Subscription.objects.filter(status="expired").update(status="active")
+
+    due = Subscription.objects.filter(status="active", current_period_end__lt=cutoff).count()
+    began = time.perf_counter()
+    totals = [sum(counts) for counts in zip(*lifecycle.sweep_expired(now=now, chunk_size=args.chunk_size))]
+    elapsed = time.perf_counter() - began
+    print(f"per-row save (before): {per_row * due:8.1f}s for {due} rows (extrapolated from {args.sample})")
+    print(f"set-based sweep (after): {elapsed:6.1f}s, {totals[0]} trials and {totals[1]} paid periods expired")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Helpers shared by the benchmark scripts in this directory.
+
+Benchmarks run against a throwaway test database (in memory for SQLite,
+``test_<name>`` for PostgreSQL) so they never touch real data.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+
+def setup_django():
+    import django
+    django.setup()
+
+
+def create_test_db(migrate=True):
+    """Create the test database and return its connection.
+
+    With ``migrate=False`` tables are created straight from the current
+    model definitions, which lets a benchmark alter ``Model._meta`` first.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.settings_dict.setdefault("TEST", {})["MIGRATE"] = migrate
+    connection.creation.create_test_db(verbosity=0)
+    return connection
+
+
+def measure(fn, repeat=1000):
+    """Call ``fn`` ``repeat`` times and return the mean latency in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
@@ -0,0 +1,85 @@
+"""Stub tool backend that receives entitlement change callbacks.
+
+    python scripts/entitlement_receiver.py --port 12112 --secret <endpoint secret>
+    python manage.py deliver_entitlements --loop
+
+Register ``http://127.0.0.1:12112/`` as an EntitlementEndpoint in the admin
+and paste its secret here. Each verified batch is printed; ``--fail-rate``
+answers that share of requests with a 503 to exercise retries.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Reject callbacks signed longer ago than this, in seconds.
+TOLERANCE = 300
+
+
+def verify(header, body, secret, now=None):
+    """Check an ``X-Crisp-Signature`` header against the raw request body."""
+    try:
+        parts = dict(item.split("=", 1) for item in header.split(","))
+        timestamp = int(parts["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs((now or time.time()) - timestamp) > TOLERANCE:
+        return False
+    expected = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, parts.get("v1", ""))
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    secret = ""
+    fail_rate = 0.0
+    received = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not verify(self.headers.get("X-Crisp-Signature", ""), body, self.secret):
+            return self._reply(400)
+        if random.random() < self.fail_rate:
+            return self._reply(503)
+        events = json.loads(body)["events"]
+        self.received.extend(events)
+        for event in events:
+            print(f"user {event['user_id']} ({event['email']}) tool {event['tool_id']}: {event['status']}")
+        self._reply(204)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, secret="", fail_rate=0.0):
+    """Start the receiver in a daemon thread; verified events collect in ``server.received``."""
+    received = []
+    handler = type("Handler", (ReceiverHandler,), {"secret": secret, "fail_rate": fail_rate, "received": received})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.received = received
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=12112)
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = serve(args.port, args.secret, args.fail_rate)
+    print(f"Entitlement receiver listening on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
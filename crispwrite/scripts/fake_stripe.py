@@ -0,0 +1,71 @@
+"""Minimal stand-in for the Stripe API, for load testing checkout locally.
+
+    python scripts/fake_stripe.py --port 12111 --latency 0.5
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_SECRET_KEY=sk_test_fake uvicorn backend.asgi:application
+
+Only ``POST /v1/checkout/sessions`` is implemented. Each response is delayed
+by ``--latency`` seconds to imitate a slow Stripe region.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ids = itertools.count(1)
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path != "/v1/checkout/sessions":
+            return self._reply(404, {"error": {"type": "invalid_request_error", "message": "Unknown path"}})
+        time.sleep(self.latency)
+        session_id = f"cs_test_{next(_ids)}"
+        self._reply(200, {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.test/c/pay/{session_id}",
+            "expires_at": int(time.time()) + 86400,
+        })
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, latency=0.0):
+    """Start the fake server in a daemon thread and return it."""
+    handler = type("Handler", (FakeStripeHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler, bind_and_activate=False)
+    server.daemon_threads = True
+    # The default listen backlog of 5 would stall bursts of connections.
+    server.request_queue_size = 1024
+    server.server_bind()
+    server.server_activate()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = serve(args.port, args.latency)
+    print(f"Fake Stripe listening on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    """Keep one row per (user, tool) so the unique constraint can be added.
+
+    An active row wins over any other status, then the most recent one.
+    """
+    Subscription = apps.get_model('payments', 'Subscription')
+    duplicates = (
+        Subscription.objects.values('user_id', 'tool_id')
+        .annotate(rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for pair in duplicates.iterator():
+        rows = Subscription.objects.filter(user_id=pair['user_id'], tool_id=pair['tool_id'])
+        keep = sorted(rows.values_list('status', 'id'), key=lambda row: (row[0] == 'active', row[1]))[-1]
+        rows.exclude(id=keep[1]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'status'], name='sub_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'tool', 'status'], name='sub_user_tool_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'tool'), name='unique_subscription_user_tool'),
+        ),
+    ]
@@ -19,3 +19,12 @@ class Subscription(models.Model):
     tool = models.ForeignKey(Tool, on_delete=models.CASCADE)
     status = models.CharField(max_length=50)
     email = models.EmailField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status"], name="sub_user_status_idx"),
+            models.Index(fields=["user", "tool", "status"], name="sub_user_tool_status_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tool"], name="unique_subscription_user_tool"),
+        ]
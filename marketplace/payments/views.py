@@ -274,11 +274,13 @@ def stripe_webhook(request):
         try:
             user = User.objects.get(email=email)
             tool = Tool.objects.get(id=tool_id)
-            Subscription.objects.create(
+            Subscription.objects.update_or_create(
                 user=user,
                 tool=tool,
-                status="active",
-                email=email
+                defaults={
+                    "status": "active",
+                    "email": email
+                }
             )
         except Exception:
             return HttpResponse(status=400)